@@ -0,0 +1,131 @@
+#!/bin/python3
+"""
+Time every stage of the generation of reference configurations, and compare the results
+with a baseline to catch regressions.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import keyboard
+from parameters import load_parameters
+from render_cache import render_scad
+from scad_tree import count_nodes
+from scad_writer import scad_string
+
+configurations = {
+    'default': {},
+    'large': {
+        'rows': 6,
+        'columns': 8,
+        'column_stagger': [0, 0, 4.5, 9, 4.5, 2.7, 0, 0],
+    },
+    'mx': {'choc_switches': False},
+    'fine': {'precision': 0.001, 'flatten_tolerance': 0.001},
+}
+
+# counters are deterministic and compared exactly, timings may vary this much before it is a regression
+time_tolerance = 1.5
+# (and differences shorter than this are noise)
+time_floor = 0.005
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return res, best
+
+def benchmark(overrides, repeat=3, openscad=None):
+    params = load_parameters(overrides=overrides)
+    res = {'timings': {}, 'counters': {}}
+    timings = res['timings']
+    counters = res['counters']
+
+    def sample():
+        keyboard.thumb_cluster_geometry.cache_clear()
+        tc, sh = keyboard.make_shell(params)
+        tc.get_geometry()
+        return tc, sh
+    (tc, sh), timings['sampling'] = best_time(sample, repeat)
+    counters['outline_vertices'] = len(sh.get_shape_points()) + len(tc.get_shape_points())
+    counters['thumb_samples'] = len(tc.thumb_curve_points)
+
+    def build():
+        keyboard.thumb_cluster_geometry.cache_clear()
+        return keyboard.preview_parts(keyboard.make_parts(params, names=keyboard.preview_names))
+    parts, timings['tree'] = best_time(build, repeat)
+    counters['nodes'] = sum(count_nodes(tree) for tree in parts.values())
+
+    def serialize():
+        prepared, modules = keyboard.prepare_parts(parts)
+        return prepared, scad_string(prepared, modules)
+    (prepared, text), timings['serialization'] = best_time(serialize, repeat)
+    counters['nodes_instanced'] = sum(count_nodes(tree) for tree in prepared.values())
+    counters['scad_bytes'] = len(text.encode())
+
+    if openscad is not None:
+        top = keyboard.scad_text(keyboard.make_parts(params, names=['top'])['top'])
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            render_scad(top, os.path.join(tmp, 'top.stl'), openscad=openscad)
+            timings['render_top'] = time.perf_counter() - start
+            counters['stl_bytes'] = os.path.getsize(os.path.join(tmp, 'top.stl'))
+    return res
+
+def compare(results, baseline):
+    regressions = []
+    for name, res in results.items():
+        if name not in baseline:
+            continue
+        for stage, elapsed in res['timings'].items():
+            ref = baseline[name]['timings'].get(stage)
+            if ref is not None and elapsed > ref * time_tolerance and elapsed - ref > time_floor:
+                regressions.append(f"{name}: {stage} took {elapsed:.4f}s, baseline {ref:.4f}s")
+        for counter, value in res['counters'].items():
+            ref = baseline[name]['counters'].get(counter)
+            # a different count in either direction means the output changed, or the baseline is stale
+            if ref is not None and value != ref:
+                regressions.append(f"{name}: {counter} is {value}, baseline {ref}")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('configurations', nargs='*', help=f"among {', '.join(configurations)} (default: all)")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="runs of each stage, the best one is kept")
+    parser.add_argument('--openscad', help="also time the render of the top shell with this OpenSCAD executable")
+    parser.add_argument('--baseline', default=os.path.join(os.path.dirname(__file__), 'benchmark_baseline.json'))
+    parser.add_argument('--save', action='store_true', help="store the results as the new baseline")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.configurations or configurations:
+        res = benchmark(configurations[name], args.repeat, args.openscad)
+        res['timings'] = {stage: round(t, 5) for stage, t in res['timings'].items()}
+        results[name] = res
+        stages = ", ".join(f"{stage} {t * 1000:.1f}ms" for stage, t in res['timings'].items())
+        counters = ", ".join(f"{counter} {v}" for counter, v in res['counters'].items())
+        print(f"{name}: {stages}\n    {counters}")
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=1)
+            f.write('\n')
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f))
+        for r in regressions:
+            print("REGRESSION", r)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,598 @@
+"""
+The geometry of the keyboard as plain numbers: the bezier curves, the key positions and the
+case outline. solid is only imported to build the SCAD objects, and bezier when a curve is
+first made, so tools which only need the numbers load quickly.
+"""
+
+import copy
+import functools
+import json
+import math
+
+import numpy as np
+
+from layout import KeyLayout
+from vector import Pose, Vec, apply_poses
+
+eps = 0.001
+
+def bezier_from_points(points):
+    if len(points) != 4:
+        raise ValueError
+    import bezier
+    xs = [points[0][0], points[1][0], points[2][0], points[3][0]]
+    ys = [points[0][1], points[1][1], points[2][1], points[3][1]]
+    return bezier.Curve([xs, ys], degree=3)
+
+def bernstein_matrix(degree, params):
+    # one row per parameter value, one column per control point
+    params = np.asarray(params, dtype=float)[:, np.newaxis]
+    k = np.arange(degree + 1)
+    binomials = np.array([math.comb(degree, i) for i in k], dtype=float)
+    return binomials * params ** k * (1 - params) ** (degree - k)
+
+def bezier_parameters(precision):
+    # same values as stepping by 'precision' from 0, with the last step clamped to 1
+    steps = max(int(math.ceil(1.0 / precision - 1e-9)), 1)
+    return np.minimum(np.arange(steps + 1) * precision, 1.0)
+
+def evaluate_bezier(curve, params):
+    # positions and tangents of the curve at every parameter value
+    nodes = curve.nodes
+    degree = nodes.shape[1] - 1
+    coords = bernstein_matrix(degree, params) @ nodes.T
+    hodograph = degree * np.diff(nodes, axis=1)
+    tangents = bernstein_matrix(degree - 1, params) @ hodograph.T
+    return coords, tangents
+
+def sample_bezier_evenly(curve, precision):
+    return evaluate_bezier(curve, bezier_parameters(precision))
+
+def convert_bezier_points(points):
+    res=[]
+    trivial = True
+    for i in range(0, len(points)):
+        if (i % 3) == 0:
+            res.append(points[i])
+        else:
+            handle = points[i]
+            point = points[i - 1] if (i % 3) == 1 else points[(i + 1) % len(points)]
+            if type(handle[0]) == str:
+                if handle[0] == "SHARP":
+                    res.append(point)
+                elif handle[0] == "RELATIVE":
+                    trivial = False
+                    res.append(Vec(point) + handle[1:])
+                elif handle[0] == "POLAR":
+                    trivial = False
+                    res.append(Vec(point) + Vec.polar(handle[1], handle[2] * math.pi / 180.))
+                else:
+                    print(handle)
+                    raise ValueError
+            else:
+                trivial = False
+                res.append(handle)
+    return res, trivial
+
+def bezier_handles(points):
+    """
+    The control points of each segment of a bezier path (as given to bezier_lines), as
+    [point, handle, handle, next point] with the handles converted to positions.
+    """
+    res = []
+    for i in range(0, len(points) - 2, 3):
+        segment, _ = convert_bezier_points([points[i], points[i + 1], points[i + 2], points[(i + 3) % len(points)]])
+        res.append([Vec(p) for p in segment])
+    return res
+
+def split_bezier(ctrl):
+    # de Casteljau subdivision at the middle of the curve
+    left = [ctrl[0]]
+    right = [ctrl[-1]]
+    while len(ctrl) > 1:
+        ctrl = (ctrl[:-1] + ctrl[1:]) / 2
+        left.append(ctrl[0])
+        right.append(ctrl[-1])
+    return np.array(left), np.array(right[::-1])
+
+def bezier_flatness(ctrl):
+    # distance of the handles to the chord (the segment, not its line, as handles past its ends
+    # make the curve overshoot them), an upper bound of how far the curve strays from it
+    # (on python floats, numpy is slower for so few points)
+    (x0, y0), *handles, (x1, y1) = ctrl.tolist()
+    dx, dy = x1 - x0, y1 - y0
+    length_squared = dx * dx + dy * dy
+    res = 0.0
+    for x, y in handles:
+        x, y = x - x0, y - y0
+        if length_squared >= eps ** 2:
+            along = min(max((x * dx + y * dy) / length_squared, 0.0), 1.0)
+            x, y = x - along * dx, y - along * dy
+        res = max(res, math.hypot(x, y))
+    return res
+
+def flatten_bezier(curve, tolerance, max_depth=16):
+    ctrl = curve.nodes.T
+    res = [ctrl[0]]
+    stack = [(ctrl, 0)]
+    while stack:
+        ctrl, depth = stack.pop()
+        if depth >= max_depth or bezier_flatness(ctrl) <= tolerance:
+            res.append(ctrl[-1])
+        else:
+            left, right = split_bezier(ctrl)
+            stack.append((right, depth + 1))
+            stack.append((left, depth + 1))
+    return np.array(res)
+
+def bezier_lines(points, precision, tolerance=None, vertex_counts=None):
+    """
+    Flatten a closed bezier path into a list of points.
+    Curved segments are sampled every 'precision' in parameter space, or, if 'tolerance'
+    is set, subdivided until they deviate from their chords by at most 'tolerance' (in mm).
+    The number of vertices emitted per segment is appended to 'vertex_counts' if given.
+    Segments between two equal points are skipped, and the points where segments join
+    (including the last and first ones) are only emitted once.
+    """
+    res = []
+    offset = 0
+    while offset + 2 < len(points):
+        p1 = points[offset]
+        h1 = points[offset+1]
+        h2 = points[offset+2]
+        p2 = points[(offset+3) % len(points)]
+        offset += 3
+        if math.dist(p1, p2) < eps:
+            if vertex_counts is not None:
+                vertex_counts.append(0)
+            continue
+        subset, trivial = convert_bezier_points([p1, h1, h2, p2])
+        if trivial:
+            sampled = [p1, p2]
+        else:
+            curve = bezier_from_points(subset)
+            if tolerance is None:
+                sampled, _ = sample_bezier_evenly(curve, precision)
+            else:
+                sampled = flatten_bezier(curve, tolerance)
+            sampled = sampled.tolist()
+        if res and math.dist(res[-1], sampled[0]) < eps:
+            sampled = sampled[1:]
+        res += sampled
+        if vertex_counts is not None:
+            vertex_counts.append(len(sampled))
+    # the path is closed, its last point joins the first one
+    if len(res) > 1 and math.dist(res[-1], res[0]) < eps:
+        res.pop()
+        if vertex_counts is not None:
+            # from the last segment which emitted any
+            last = max(i for i, count in enumerate(vertex_counts) if count)
+            vertex_counts[last] -= 1
+    return res
+
+def outline_defects(points, tolerance=eps):
+    """
+    The vertices of a closed outline which repeat the previous one ('duplicate') or where it
+    turns back on itself ('reversal'), as (kind, index) pairs.
+    """
+    points = np.asarray(points, dtype=float)
+    edges = np.roll(points, -1, axis=0) - points
+    lengths = np.hypot(*edges.T)
+    res = [('duplicate', int(i)) for i in np.flatnonzero(lengths < tolerance)]
+    # consecutive edges going in opposite directions, the repeated vertices left out
+    kept = np.flatnonzero(lengths >= tolerance)
+    e1 = edges[kept]
+    e2 = np.roll(e1, -1, axis=0)
+    cross = e1[:, 0] * e2[:, 1] - e1[:, 1] * e2[:, 0]
+    dot = (e1 * e2).sum(axis=1)
+    folds = (dot < 0) & (np.abs(cross) <= tolerance * np.hypot(*e1.T) * np.hypot(*e2.T))
+    res += [('reversal', int(i)) for i in np.roll(kept, -1)[folds]]
+    return res
+
+gauss_legendre_nodes, gauss_legendre_weights = np.polynomial.legendre.leggauss(24)
+
+def bezier_speed(curve, params):
+    _, tangents = evaluate_bezier(curve, params)
+    return np.hypot(tangents[:, 0], tangents[:, 1])
+
+def bezier_arc_length(curve, t):
+    # length of the curve between parameters 0 and t
+    params = (gauss_legendre_nodes + 1) * t / 2
+    return t / 2 * np.dot(gauss_legendre_weights, bezier_speed(curve, params))
+
+def bezier_parameter_at_length(curve, length, total_length=None, tolerance=1e-9):
+    """
+    Invert the arc length of the curve: find t such that the curve is 'length' long between 0 and t.
+    Newton iterations, falling back to bisection whenever a step leaves the bracket.
+    """
+    if total_length is None:
+        total_length = bezier_arc_length(curve, 1.0)
+    if length <= 0:
+        return 0.0
+    if length >= total_length:
+        return 1.0
+    lo, hi = 0.0, 1.0
+    t = length / total_length
+    for _ in range(50):
+        error = bezier_arc_length(curve, t) - length
+        if abs(error) < tolerance:
+            break
+        if error > 0:
+            hi = t
+        else:
+            lo = t
+        speed = bezier_speed(curve, [t])[0]
+        t = t - error / speed if speed > eps else -1
+        if not lo < t < hi:
+            t = (lo + hi) / 2
+    return float(t)
+
+def rect_points(center, size, angle=0):
+    # corners of a rectangle centered on 'center', rotated by 'angle' (radians)
+    return Pose(center, angle).apply(np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]]) * size / 2).tolist()
+
+class ThumbCluster:
+    # changing any of these after construction rebuilds the sampled curve and the key poses on next use
+    geometry_params = ('key_count', 'bezier_points', 'position', 'keycap_size', 'keycap_spacing', 'precision')
+
+    def __init__(self,
+            key_count,
+            bezier_points,
+            position,
+            offset,
+            keycap_size,
+            keycap_spacing,
+            switch_hole_size,
+            precision):
+        self.key_count = key_count
+        self.bezier_points = bezier_points
+        self.keycap_size = keycap_size
+        self.keycap_spacing = keycap_spacing
+        self.switch_hole_size = switch_hole_size
+        self.precision = precision
+        self.position = position
+        self.offset = offset
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in self.geometry_params:
+            object.__setattr__(self, '_geometry', None)
+
+    def get_geometry(self):
+        if self._geometry is None:
+            self._geometry = self.build_geometry()
+        return self._geometry
+
+    def build_geometry(self):
+        points_converted, _ = convert_bezier_points(self.bezier_points)
+        curve = bezier_from_points(points_converted)
+        curve_length = bezier_arc_length(curve, 1.0)
+        target_length = (self.key_count - 1) * (self.keycap_size[0] + self.keycap_spacing)
+        scale_factor = target_length / curve_length
+        position = np.asarray(self.position, dtype=float)
+
+        points, tangents = sample_bezier_evenly(curve, self.precision)
+
+        # keys are evenly spaced along the curve, find their exact parameter by inverting the arc length
+        key_params = [bezier_parameter_at_length(curve, i * curve_length / (self.key_count - 1), curve_length)
+            for i in range(0, self.key_count)]
+        key_points, key_tangents = evaluate_bezier(curve, key_params)
+        key_poses = []
+        for t, p, tangent in zip(key_params, (position + scale_factor * key_points).tolist(), key_tangents):
+            key_poses.append([p, math.atan2(tangent[1], tangent[0]), t])
+
+        return {
+            'curve': curve,
+            'target_length': target_length,
+            'scale_factor': scale_factor,
+            'points': position + scale_factor * points,
+            'tangents': tangents,
+            'key_poses': key_poses,
+        }
+
+    @property
+    def bezier_curve(self):
+        return self.get_geometry()['curve']
+
+    @property
+    def curve_target_length(self):
+        return self.get_geometry()['target_length']
+
+    @property
+    def curve_scale_factor(self):
+        return self.get_geometry()['scale_factor']
+
+    @property
+    def thumb_curve_points(self):
+        return self.get_geometry()['points']
+
+    @property
+    def thumb_curve_tangents(self):
+        return self.get_geometry()['tangents']
+
+    def get_key_count(self):
+        return self.key_count
+
+    def bezier_handles(self):
+        # of the thumb curve, scaled and moved like it
+        points, _ = convert_bezier_points(self.bezier_points)
+        return [[Vec(self.position) + float(self.curve_scale_factor) * Vec(p) for p in points]]
+
+    def get_thumb_keys_pos(self):
+        # [position, angle, curve parameter] of every key
+        return self.get_geometry()['key_poses']
+
+    def get_key_coord(self, key_index, tangent_offset = 0, perpendicular_offset = 0):
+        # the Pose of the key center, moved by the offsets along and across the curve
+        key = self.get_thumb_keys_pos()[key_index]
+        # the line is defined along the bottom edge of the keycap, so we add an offset
+        po = perpendicular_offset + self.keycap_size[1]/2
+        pose = Pose(key[0], key[1])
+        return Pose(pose.transform([tangent_offset, po]), pose.angle)
+
+    def get_curve_normals(self):
+        angles = np.arctan2(self.thumb_curve_tangents[:, 1], self.thumb_curve_tangents[:, 0]) + math.pi/2
+        return angles, np.column_stack([np.cos(angles), np.sin(angles)])
+
+    def get_keycap_rectangles(self):
+        """
+        The keycap (plus offset) placed at every sample of the curve, as an array of rectangles
+        [back inner, front inner, front outer, back outer], the inner side being that of get_shape_points().
+        """
+        _, normals = self.get_curve_normals()
+        directions = np.column_stack([normals[:, 1], -normals[:, 0]])[:, np.newaxis]
+        half_width = self.keycap_size[0]/2 + self.offset
+        sides = np.array([-self.offset, -self.offset, self.keycap_size[1] + self.offset, self.keycap_size[1] + self.offset])
+        along = np.array([-half_width, half_width, half_width, -half_width])
+        return (self.thumb_curve_points[:, np.newaxis] + normals[:, np.newaxis] * sides[:, np.newaxis]
+            + directions * along[:, np.newaxis])
+
+    def get_band_points(self):
+        """
+        Outline of the union of the keycap rectangles swept along the curve. On the concave side it
+        follows the offset curve, on the convex side the corners of the rectangles, which stick out
+        past it (by about 0.6mm), so that it covers all of them.
+        """
+        rects = self.get_keycap_rectangles()
+        curve = self.thumb_curve_points
+        offsets = [-self.offset, self.keycap_size[1] + self.offset]
+        _, normals = self.get_curve_normals()
+        chains = []
+        for side, corners in [(0, rects[:, [0, 1]]), (1, rects[:, [3, 2]])]:
+            candidates = np.vstack([curve + normals * offsets[side], corners.reshape(-1, 2)])
+            # the candidates on the boundary of the union are those inside no rectangle
+            origin = rects[:, 0]
+            u_axis = rects[:, 1] - origin
+            v_axis = rects[:, 3] - origin
+            rel = candidates[:, np.newaxis] - origin
+            u = (rel * u_axis).sum(axis=2) / (u_axis ** 2).sum(axis=1)
+            v = (rel * v_axis).sum(axis=2) / (v_axis ** 2).sum(axis=1)
+            margin = eps / (self.keycap_size[1] + 2 * self.offset)
+            inside = ((u > margin) & (u < 1 - margin) & (v > margin) & (v < 1 - margin)).any(axis=1)
+            candidates = candidates[~inside]
+            # ordered by their projection on the curve, extended past its ends
+            starts = curve[:-1]
+            segments = curve[1:] - starts
+            rel = candidates[:, np.newaxis] - starts
+            t = (rel * segments).sum(axis=2) / (segments ** 2).sum(axis=1)
+            t[:, 1:] = np.maximum(t[:, 1:], 0)
+            t[:, :-1] = np.minimum(t[:, :-1], 1)
+            distances = np.hypot(*(rel - t[:, :, np.newaxis] * segments).transpose(2, 0, 1))
+            nearest = np.argmin(distances, axis=1)
+            chains.append(candidates[np.argsort(nearest + t[np.arange(len(candidates)), nearest], kind='stable')])
+        return np.vstack([chains[0], chains[1][::-1]]).tolist()
+
+    def make_shape(self):
+        from solid import polygon
+        return polygon(points=self.get_band_points())
+
+    def get_shape_points(self):
+        _, normals = self.get_curve_normals()
+        res = self.thumb_curve_points - normals * self.offset
+        return res[::-1].tolist()
+
+    def make_switch_holes(self):
+        from solid import rotate, square, translate
+        shape = square(0)
+        for i in range(0, self.get_key_count()):
+            key_pos, key_angle = self.get_key_coord(i, 0, 0)
+            shape += translate(key_pos)(rotate([0,0,key_angle / math.pi * 180])(
+                square(self.switch_hole_size, center=True)))
+        return shape
+
+    def switch_hole_polygons(self):
+        centers = [self.get_key_coord(i, 0, 0) for i in range(0, self.get_key_count())]
+        corners = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]]) * self.switch_hole_size / 2
+        return apply_poses([c.position for c in centers], [c.angle for c in centers], corners).tolist()
+
+    def switches_positions(self):
+        res = []
+        for i in range(0, self.get_key_count()):
+            key_pos, key_angle = self.get_key_coord(i, 0, 0)
+            res.append([key_pos, key_angle / math.pi * 180])
+        return res
+
+    def get_top_left(self):
+        return self.get_key_coord(0, -self.keycap_size[0]/2 - self.offset, self.keycap_size[1]/2 + self.offset)[0]
+
+    def get_top_right(self):
+        return self.get_key_coord(self.key_count - 1, self.keycap_size[0]/2 + self.offset, self.keycap_size[1]/2 + self.offset)[0]
+
+    def get_bottom_left(self):
+        return self.get_key_coord(0, -self.keycap_size[0]/2 - self.offset, -self.keycap_size[1]/2 - self.offset)[0]
+
+    def get_bottom_right(self):
+        return self.get_key_coord(self.key_count - 1, self.keycap_size[0]/2 + self.offset, -self.keycap_size[1]/2 - self.offset)[0]
+
+class Shell:
+    def __init__(self, layout, thumb_cluster, switch_hole_size, shell_offset, precision, flatten_tolerance=None):
+        self.layout = layout
+        self.thumb_cluster = thumb_cluster
+        self.switch_hole_size = switch_hole_size
+        self.shell_offset = shell_offset
+        self.precision = precision
+        self.flatten_tolerance = flatten_tolerance
+
+        # [left, bottom, right, top] of the keys the outline goes around
+        anchors, bounds = layout.anchors()
+        bottom_left = bounds[anchors['bottom_left']].tolist()
+        top_left = bounds[anchors['top_left']].tolist()
+        highest_left = bounds[anchors['highest_left']].tolist()
+        highest_right = bounds[anchors['highest_right']].tolist()
+        self.top_right = bounds[anchors['top_right']].tolist()
+        bottom_left_height = float(layout.sizes[anchors['bottom_left']][1])
+
+        def handle(length, a, b):
+            # handles longer than half the segment make it fold back on itself, when the anchors
+            # are close (keys of the same height, e.g. a flat top row)
+            return min(length, math.dist(a, b) / 2)
+        top_left_point = [top_left[0] - shell_offset, top_left[3] + shell_offset]
+        highest_left_point = [highest_left[0], highest_left[3] + shell_offset]
+        highest_right_point = [highest_right[2], highest_right[3] + shell_offset]
+        panel_point = [self.panel_left(), self.panel_top()]
+        left_handle = handle(25, top_left_point, highest_left_point)
+        right_handle = handle(15, highest_right_point, panel_point)
+
+        casepoints = [ # goes clockwise, starting from bottom left
+            self.thumb_cluster.get_bottom_left(),
+                ["RELATIVE", 0, 15],
+                ["RELATIVE", 5, 0],
+            [bottom_left[0] + 2*bottom_left_height, bottom_left[1] - shell_offset],
+                ["SHARP"],
+                ["SHARP"],
+            [bottom_left[0] - shell_offset, bottom_left[1] - shell_offset], # BOTTOM LEFT
+                ["SHARP"],
+                ["SHARP"],
+            top_left_point, # TOP LEFT
+                ["RELATIVE", left_handle, 0],
+                ["RELATIVE", -left_handle, 0],
+            highest_left_point,
+                ["SHARP"],
+                ["SHARP"],
+            highest_right_point,
+                ["POLAR", right_handle, 0],
+                ["POLAR", right_handle, 180],
+            panel_point,
+                ["SHARP"],
+                ["SHARP"],
+            [self.panel_left() + self.panel_width(), self.panel_top()], # TOP RIGHT
+                ["SHARP"],
+                ["SHARP"],
+            [self.panel_left() + self.panel_width(), 0],
+                ["RELATIVE", 0, -8],
+                ["POLAR", 8, 125],
+            self.thumb_cluster.get_top_right(), # THUMB CLUSTER, TOP RIGHT
+                ["SHARP"],
+                ["SHARP"],
+            self.thumb_cluster.get_bottom_right(),
+        ]
+
+        self.outline_bezier_points = casepoints
+        self.outline_vertex_counts = []
+        self.bezier_curve = bezier_lines(casepoints, self.precision,
+            tolerance=self.flatten_tolerance, vertex_counts=self.outline_vertex_counts)
+
+
+    def panel_top(self):
+        return self.top_right[3] + self.shell_offset
+    def panel_width(self):
+        return 24
+    def panel_height(self):
+        return 92
+    def panel_left(self):
+        return self.top_right[2]
+    def panel_right(self):
+        return  self.panel_left() + self.panel_width()
+
+    def get_key_position(self, row, col, center=False):
+        key = self.layout.key_index(row, col)
+        pos = self.layout.centers[key]
+        return (pos if center else pos - self.layout.sizes[key] / 2).tolist()
+
+    def get_shape_points(self):
+        return self.bezier_curve
+
+    def bezier_handles(self):
+        return bezier_handles(self.outline_bezier_points)
+
+    def get_outline_points(self):
+        # the whole outline of the case, the thumb cluster included
+        return self.get_shape_points() + self.thumb_cluster.get_shape_points()
+
+    def make_switch_holes(self):
+        from solid import rotate, square, translate, union
+        hole = square(self.switch_hole_size, center=True)
+        holes = []
+        for pos, angle in self.switches_positions():
+            holes.append(translate(pos)(rotate(angle)(hole) if angle else hole))
+        return union()(*holes)
+
+    def switch_hole_polygons(self):
+        return self.layout.corners(self.switch_hole_size).tolist()
+
+    def switches_positions(self):
+        return [[pos, angle] for pos, angle in zip(self.layout.centers.tolist(), self.layout.rotations.tolist())]
+
+@functools.lru_cache(maxsize=16)
+def thumb_cluster_geometry(key):
+    geometry = ThumbCluster(**json.loads(key)).get_geometry()
+    # shared by the clusters made with the same parameters
+    geometry['points'].flags.writeable = False
+    geometry['tangents'].flags.writeable = False
+    return geometry
+
+def make_thumb_cluster(**kwargs):
+    # variants of a design often share the same thumb cluster, don't compute its geometry again for each
+    # of them (the most recently used ones are kept); every call gets its own cluster, which can be changed
+    tc = ThumbCluster(**kwargs)
+    geometry = thumb_cluster_geometry(json.dumps(kwargs, sort_keys=True))
+    tc._geometry = dict(geometry, key_poses=copy.deepcopy(geometry['key_poses']))
+    return tc
+
+# the parameters read by make_shell
+shell_parameters = ['choc_switches', 'thumb_cluster_key_count', 'thumb_bezier_points', 'thumb_keycap_spacing',
+    'switch_hole_size', 'thumb_position', 'shell_offset', 'precision', 'keycap_dist', 'layout', 'rows', 'columns',
+    'column_stagger', 'flatten_tolerance']
+
+def make_shell(params):
+    """
+    The thumb cluster and the shell (main key grid and case outline) described by the parameters.
+    """
+    keycap_size = [18,17 if params['choc_switches'] else 18]
+    tc = make_thumb_cluster(
+        key_count = params['thumb_cluster_key_count'],
+        bezier_points = params['thumb_bezier_points'],
+        keycap_size = keycap_size,
+        keycap_spacing = params['thumb_keycap_spacing'],
+        switch_hole_size = params['switch_hole_size'],
+        position = params['thumb_position'],
+        offset = params['shell_offset'],
+        precision = params['precision'],
+    )
+
+    pitch = Vec(keycap_size) + params['keycap_dist']
+    if params['layout']:
+        layout = KeyLayout.load_kle(params['layout'], pitch, params['keycap_dist'])
+        layout = layout.moved([params['shell_offset'], params['shell_offset']])
+    else:
+        layout = KeyLayout.from_grid(params['rows'], params['columns'], keycap_size, pitch,
+            params['column_stagger'], params['shell_offset'])
+
+    sh = Shell(layout = layout,
+        switch_hole_size = params['switch_hole_size'],
+        thumb_cluster = tc,
+        shell_offset = params['shell_offset'],
+        precision = params['precision'],
+        flatten_tolerance = params['flatten_tolerance'] or None,
+    )
+    return tc, sh
+
+def wall_full_width(params):
+    return params['wall_outer_width'] + params['wall_inner_width']
+
+def jack_position(params, sh):
+    return [sh.panel_right() - wall_full_width(params), 6]
+
+def controller_position(params, sh):
+    # top right corner of the space of the board in the panel, see Controller.move_into_place
+    return [sh.panel_right() - wall_full_width(params), sh.panel_top()]
@@ -0,0 +1,185 @@
+"""
+Fast interference checks between the components placed in the case, done on their 2D
+footprints (circles and convex polygons) so that collisions are caught before rendering.
+"""
+
+import math
+
+import numpy as np
+
+class Footprint:
+    """
+    The area covered by a component between heights z[0] and z[1]. Footprints of the same
+    'group' (e.g. a screw's pillar and its hole) may overlap, as may those of some pairs of
+    kinds. The footprint must be at least 'wall' away from the outside of the case, or only
+    have its center inside it if 'wall' is None (for things which go through the wall).
+    """
+    def __init__(self, name, z, center, radius=None, points=None, kind=None, group=None, wall=0):
+        self.name = name
+        self.kind = name.split()[0] if kind is None else kind
+        self.z = z
+        self.center = np.asarray(center, dtype=float)
+        self.radius = radius
+        self.points = None if points is None else np.asarray(points, dtype=float)
+        self.group = name if group is None else group
+        self.wall = wall
+
+    @staticmethod
+    def circle(name, z, center, diameter, **kwargs):
+        return Footprint(name, z, center, radius=diameter / 2, **kwargs)
+
+    @staticmethod
+    def polygon(name, z, points, **kwargs):
+        # the points of a convex polygon
+        return Footprint(name, z, np.mean(points, axis=0), points=points, **kwargs)
+
+    def bbox(self):
+        if self.points is None:
+            x, y = self.center
+            return x - self.radius, y - self.radius, x + self.radius, y + self.radius
+        return (*self.points.min(axis=0), *self.points.max(axis=0))
+
+def segment_distances(points, starts, ends):
+    # distance from every point to every segment, one row per point
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    px = points[:, np.newaxis, 0]
+    py = points[:, np.newaxis, 1]
+    sx, sy = starts.T
+    dx, dy = (ends - starts).T
+    t = np.clip(((px - sx) * dx + (py - sy) * dy) / np.maximum(dx * dx + dy * dy, 1e-18), 0, 1)
+    return np.hypot(sx + t * dx - px, sy + t * dy - py)
+
+def polygon_edges(points):
+    return points, np.roll(points, -1, axis=0)
+
+def contains(starts, ends, points):
+    # whether each point is inside the polygon with these edges, with the even-odd rule
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    px = points[:, np.newaxis, 0]
+    py = points[:, np.newaxis, 1]
+    crosses = (starts[:, 1] > py) != (ends[:, 1] > py)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = starts[:, 0] + (py - starts[:, 1]) * (ends[:, 0] - starts[:, 0]) / (ends[:, 1] - starts[:, 1])
+    return np.count_nonzero(crosses & (x > px), axis=1) % 2 == 1
+
+def polygon_gap(a, b):
+    # separating axis test, negative when they overlap (by at least that much)
+    res = -math.inf
+    for points in [a, b]:
+        edges = np.roll(points, -1, axis=0) - points
+        normals = np.stack([edges[:, 1], -edges[:, 0]], axis=1)
+        normals /= np.maximum(np.hypot(*normals.T), 1e-18)[:, np.newaxis]
+        pa = a @ normals.T
+        pb = b @ normals.T
+        gaps = np.maximum(pb.min(axis=0) - pa.max(axis=0), pa.min(axis=0) - pb.max(axis=0))
+        res = max(res, gaps.max())
+    return res
+
+def gap(f1, f2):
+    """
+    Distance between two footprints, negative if they overlap.
+    """
+    if f1.points is not None and f2.points is not None:
+        return polygon_gap(f1.points, f2.points)
+    if f1.points is not None:
+        f1, f2 = f2, f1
+    if f2.points is None:
+        return np.hypot(*(f1.center - f2.center)) - f1.radius - f2.radius
+    edges = polygon_edges(f2.points)
+    distance = segment_distances(f1.center, *edges).min()
+    if contains(*edges, f1.center)[0]:
+        return -distance - f1.radius
+    return distance - f1.radius
+
+class GridIndex:
+    """
+    Uniform grid of square cells, each listing the items whose bounding box touches it.
+    """
+    def __init__(self, cell_size=10):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def cell_range(self, bbox):
+        x0, y0, x1, y1 = (math.floor(c / self.cell_size) for c in bbox)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield x, y
+
+    def insert(self, item, bbox):
+        for cell in self.cell_range(bbox):
+            self.cells.setdefault(cell, []).append(item)
+
+    def query(self, bbox):
+        res = set()
+        for cell in self.cell_range(bbox):
+            res.update(self.cells.get(cell, ()))
+        return res
+
+    def pairs(self):
+        res = set()
+        for items in self.cells.values():
+            for i, a in enumerate(items):
+                for b in items[i + 1:]:
+                    res.add((min(a, b), max(a, b)))
+        return res
+
+def check_interference(footprints, outline, allowed=(), tolerance=0.2, cell_size=10):
+    """
+    Return the problems found, as (kind, names, amount) tuples, where kind is:
+    - 'overlap': two footprints overlap by 'amount' at heights where both exist, unless they
+      are of the same group or their pair of kinds is in 'allowed'
+    - 'wall': the footprint is only 'amount' away from the outline, less than its 'wall'
+    - 'outside': the footprint is not in the case outline
+    """
+    starts, ends = polygon_edges(np.asarray(outline, dtype=float))
+    edge_index = GridIndex(cell_size)
+    edge_bboxes = np.concatenate([np.minimum(starts, ends), np.maximum(starts, ends)], axis=1)
+    for i, bbox in enumerate(edge_bboxes.tolist()):
+        edge_index.insert(i, bbox)
+    index = GridIndex(cell_size)
+    bboxes = [f.bbox() for f in footprints]
+    for i, bbox in enumerate(bboxes):
+        index.insert(i, bbox)
+
+    res = []
+    for i, j in sorted(index.pairs()):
+        a, b = footprints[i], footprints[j]
+        if a.group == b.group or a.z[1] <= b.z[0] or b.z[1] <= a.z[0]:
+            continue
+        if (a.kind, b.kind) in allowed or (b.kind, a.kind) in allowed:
+            continue
+        amount = -gap(a, b)
+        if amount > tolerance:
+            res.append(('overlap', (a.name, b.name), amount))
+
+    inside = contains(starts, ends, [f.center for f in footprints])
+    for f, bbox, is_inside in zip(footprints, bboxes, inside):
+        if not is_inside:
+            res.append(('outside', (f.name,), 0))
+            continue
+        if f.wall is None:
+            continue
+        x0, y0, x1, y1 = bbox
+        edges = list(edge_index.query((x0 - f.wall, y0 - f.wall, x1 + f.wall, y1 + f.wall)))
+        if not edges:
+            continue
+        if f.points is None:
+            distance = segment_distances(f.center, starts[edges], ends[edges]).min() - f.radius
+        else:
+            distance = segment_distances(f.points, starts[edges], ends[edges]).min()
+            if not contains(starts, ends, f.points).all():
+                distance = -distance
+        if distance < f.wall - tolerance:
+            res.append(('wall', (f.name,), distance))
+    return res
+
+def describe(problem):
+    kind, names, amount = problem
+    if kind == 'overlap':
+        return f"{names[0]} and {names[1]} overlap by {amount:.2f}mm"
+    if kind == 'wall':
+        return f"{names[0]} is {amount:.2f}mm from the outside of the case"
+    if kind in ['duplicate', 'reversal']:
+        what = "repeats the previous one" if kind == 'duplicate' else "turns back on itself"
+        return f"the {names[0]} {what} at vertex {amount}"
+    return f"{names[0]} is outside of the case"
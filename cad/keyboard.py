@@ -3,10 +3,31 @@
 from solid import *
 from solid.utils import *
 import sys
+import os
+import time
+import argparse
+import concurrent.futures
+import json
 import math
-import bezier
+import copy
+import shutil
+import numpy as np
+from scad_tree import normalize_tree, instance_modules
+from render_cache import RenderCache, render_scad
+from scad_writer import default_decimals, pipe_to_openscad, scad_string, write_scad
+from parameters import default_parameters, layout_stamp, load_parameters, load_sweep, watch_file
+from profiling import Profiler
+from interference import Footprint, GridIndex, check_interference, contains, describe, polygon_edges
+from layout import OTHER_KEY
+from vector import Vec
+from geometry import (eps, bezier_lines, rect_points, ThumbCluster, Shell, thumb_cluster_geometry, make_shell,
+    outline_defects, shell_parameters, controller_position, jack_position)
+import query
+from quality import quality_tier, tiers
+from targets import Target, TargetGraph
+from stl import open_edges, read_stl, stitch, write_stl
+from placement import candidate_positions, outline_centroid, outline_grid, place_balanced, place_spread
 
-eps = 0.001
 layer_height = 0.2
 
 def bezier_visualize(points, diameter, width):
@@ -24,327 +45,31 @@ def bezier_visualize(points, diameter, width):
         i += 3
     return res
 
-def bezier_from_points(points):
-    if len(points) != 4:
-        raise ValueError
-    xs = [points[0][0], points[1][0], points[2][0], points[3][0]]
-    ys = [points[0][1], points[1][1], points[2][1], points[3][1]]
-    return bezier.Curve([xs, ys], degree=3)
-
-def sample_bezier_evenly(curve, precision):
-    coords = []
-    tangents = []
-    x = 0.0
-    while True:
-        p = curve.evaluate(x)
-        coords.append([p[0][0], p[1][0]])
-        tangent = curve.evaluate_hodograph(x)
-        tangents.append([tangent[0][0], tangent[1][0]])
-        if x == 1.0:
-            break
-        x = min(x + precision, 1.0)
-    return coords, tangents
-
-def convert_bezier_points(points):
-    res=[]
-    trivial = True
-    for i in range(0, len(points)):
-        if (i % 3) == 0:
-            res.append(points[i])
-        else:
-            handle = points[i]
-            point = points[i - 1] if (i % 3) == 1 else points[(i + 1) % len(points)]
-            if type(handle[0]) == str:
-                if handle[0] == "SHARP":
-                    res.append(point)
-                elif handle[0] == "RELATIVE":
-                    trivial = False
-                    res.append([point[0] + handle[1], point[1] + handle[2]])
-                elif handle[0] == "POLAR":
-                    trivial = False
-                    r = handle[1]
-                    angle = handle[2] * math.pi / 180.
-                    res.append([point[0] + r * math.cos(angle), point[1] + r * math.sin(angle)])
-                else:
-                    print(handle)
-                    raise ValueError
-            else:
-                trivial = False
-                res.append(handle)
-    return res, trivial
-
-def bezier_lines(points, precision):
-    res = []
-    offset = 0
-    while offset + 2 < len(points):
-        p1 = points[offset]
-        h1 = points[offset+1]
-        h2 = points[offset+2]
-        p2 = points[(offset+3) % len(points)]
-        subset, trivial = convert_bezier_points([p1, h1, h2, p2])
-        if trivial:
-            res.append(p1)
-            res.append(p2)
-        else:
-            curve = bezier_from_points(subset)
-            sampled, _ = sample_bezier_evenly(curve, precision)
-            res += sampled
-        offset += 3
-    return res
-
-def sum_coords(*args):
-    res = [0 for i in range(0, len(args[0]))]
-    for a in args:
-        for i in range(0, len(res)):
-            res[i] += a[i]
-    return res
-
-def diff_coords(*args):
-    res = [args[0][i] for i in range(0, len(args[0]))]
-    for a in range(1, len(args)):
-        arg = args[a]
-        for i in range(0, len(res)):
-            res[i] -= arg[i]
-    return res
-
-class ThumbCluster:
-    def __init__(self,
-            key_count,
-            bezier_points,
-            position,
-            offset,
-            keycap_size,
-            keycap_spacing,
-            switch_hole_size,
-            precision):
-        self.key_count = key_count
-        self.keycap_size = keycap_size
-        self.keycap_spacing = keycap_spacing
-        self.switch_hole_size = switch_hole_size
-        points_converted, _ = convert_bezier_points(bezier_points)
-        self.bezier_curve = bezier_from_points(points_converted)
-        self.curve_target_length = (key_count - 1) * (self.keycap_size[0] + self.keycap_spacing)
-        self.curve_scale_factor = self.curve_target_length / self.bezier_curve.length
-        self.thumb_curve_points, self.thumb_curve_tangents = sample_bezier_evenly(self.bezier_curve, precision)
-        self.position = position
-        self.offset = offset
-
-        for i in range(0,len(self.thumb_curve_points)):
-            self.thumb_curve_points[i] = [
-                position[0] + self.curve_scale_factor * self.thumb_curve_points[i][0],
-                position[1] + self.curve_scale_factor * self.thumb_curve_points[i][1],
-            ]
-
-    def get_key_count(self):
-        return self.key_count
-
-    def get_thumb_keys_pos(self):
-        res = []
-        length = 0
-        dist_between_keys_center = self.curve_target_length / (self.key_count - 1)
-        for i in range(0,len(self.thumb_curve_points)-1):
-            p1 = self.thumb_curve_points[i]
-            p2 = self.thumb_curve_points[i+1]
-            t1 = self.thumb_curve_tangents[i]
-            t2 = self.thumb_curve_tangents[i+1]
-            seg_length = math.sqrt((p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2)
-            t = None
-            if i == 0:
-                t = 0
-            elif i + 1 == len(self.thumb_curve_points) - 1:
-                t = 1
-            elif length % dist_between_keys_center > (length + seg_length) % dist_between_keys_center:
-                t = 1 - ((length + seg_length) % dist_between_keys_center) / seg_length
-            if t is not None:
-                p = [(1 - t) * p1[0] + t * p2[0], (1 - t) * p1[1] + t * p2[1]]
-                t = [(1 - t) * t1[0] + t * t2[0], (1 - t) * t1[1] + t * t2[1]]
-                angle = math.atan2(t[1], t[0])
-                res.append([p, angle])
-            length += seg_length
-        return res
-
-    def get_key_coord(self, key_index, tangent_offset = 0, perpendicular_offset = 0):
-        thumb_keys_pos = self.get_thumb_keys_pos()
-        key = thumb_keys_pos[key_index]
-        cap_angle = key[1]
-        # the line is defined along the bottom edge of the keycap, so we add an offset
-        po = perpendicular_offset + self.keycap_size[1]/2
-        return [sum_coords(
-            key[0],
-            [tangent_offset * math.cos(cap_angle), tangent_offset * math.sin(cap_angle)],
-            [po * math.cos(cap_angle + math.pi/2), po * math.sin(cap_angle + math.pi/2)]
-        ), cap_angle]
-
-    def make_shape(self):
-        shape = square(0)
-        obj = square([self.keycap_size[1] + 2 * self.offset, self.keycap_size[0] + 2 * self.offset], center=True)
-        for i in range(0,len(self.thumb_curve_points)):
-            pos = self.thumb_curve_points[i]
-            tangent = self.thumb_curve_tangents[i]
-            angle = math.atan2(tangent[1], tangent[0])
-            angle += math.pi/2
-            offset_perp = self.keycap_size[1]/2
-            pos = sum_coords(pos, [math.cos(angle) * offset_perp, math.sin(angle) * offset_perp])
-            rot = rotate([0,0,angle/math.pi*180])(obj)
-            shape += translate(pos)(rot)
-        return shape
-
-    def get_shape_points(self):
-        res = []
-        for i in range(0,len(self.thumb_curve_points)):
-            pos = self.thumb_curve_points[i]
-            tangent = self.thumb_curve_tangents[i]
-            angle = math.atan2(tangent[1], tangent[0])
-            angle += math.pi/2
-            offset_perp = -self.offset
-            pos = sum_coords(pos, [math.cos(angle) * offset_perp, math.sin(angle) * offset_perp])
-            res.append(pos)
-        res.reverse()
-        return res
-
-
-    def make_switch_holes(self):
-        shape = square(0)
-        for i in range(0, self.get_key_count()):
-            key_pos, key_angle = self.get_key_coord(i, 0, 0)
-            shape += translate(key_pos)(rotate([0,0,key_angle / math.pi * 180])(
-                square(self.switch_hole_size, center=True)))
-        return shape
-
-    def switches_positions(self):
-        res = []
-        for i in range(0, self.get_key_count()):
-            key_pos, key_angle = self.get_key_coord(i, 0, 0)
-            res.append([key_pos, key_angle / math.pi * 180])
-        return res
-
-    def get_top_left(self):
-        return self.get_key_coord(0, -self.keycap_size[0]/2 - self.offset, self.keycap_size[1]/2 + self.offset)[0]
-
-    def get_top_right(self):
-        return self.get_key_coord(self.key_count - 1, self.keycap_size[0]/2 + self.offset, self.keycap_size[1]/2 + self.offset)[0]
-
-    def get_bottom_left(self):
-        return self.get_key_coord(0, -self.keycap_size[0]/2 - self.offset, -self.keycap_size[1]/2 - self.offset)[0]
-
-    def get_bottom_right(self):
-        return self.get_key_coord(self.key_count - 1, self.keycap_size[0]/2 + self.offset, -self.keycap_size[1]/2 - self.offset)[0]
-
-class Shell:
-    def __init__(self, rows, columns, keycap_size, thumb_cluster, keycap_dist, switch_hole_size, column_stagger, shell_offset, precision):
-        self.rows = rows
-        self.columns = columns
-        self.keycap_size = keycap_size
-        self.keycap_dist = keycap_dist
-        self.thumb_cluster = thumb_cluster
-        self.switch_hole_size = switch_hole_size
-        self.switch_hole_dist = diff_coords(
-            sum_coords(self.keycap_size, self.keycap_dist), self.switch_hole_size)
-
-        self.column_stagger = column_stagger
-        self.shell_offset = shell_offset
-        self.precision = precision
-
-        casepoints = [ # goes clockwise, starting from bottom left
-            self.thumb_cluster.get_bottom_left(),
-                ["RELATIVE", 0, 15],
-                ["RELATIVE", 5, 0],
-            sum_coords(self.get_key_position(0,0), [2*self.keycap_size[1], -shell_offset]),
-                ["SHARP"],
-                ["SHARP"],
-            sum_coords(self.get_key_position(0,0), [-self.shell_offset, -self.shell_offset]), # BOTTOM LEFT
-                ["SHARP"],
-                ["SHARP"],
-            sum_coords(self.get_key_position(rows-1,0), [-self.shell_offset, self.keycap_size[1] + self.shell_offset]), # TOP LEFT
-                ["RELATIVE", 25, 0],
-                ["RELATIVE", -25, 0],
-            sum_coords(self.get_key_position(rows-1,3), [0, self.keycap_size[1] + self.shell_offset]),
-                ["SHARP"],
-                ["SHARP"],
-            sum_coords(self.get_key_position(rows-1,3), self.keycap_size, [0, self.shell_offset]),
-                ["POLAR", 15, 0],
-                ["POLAR", 15, 180],
-            [self.panel_left(), self.panel_top()],
-                ["SHARP"],
-                ["SHARP"],
-            [self.panel_left() + self.panel_width(), self.panel_top()], # TOP RIGHT
-                ["SHARP"],
-                ["SHARP"],
-            [self.panel_left() + self.panel_width(), 0],
-                ["RELATIVE", 0, -8],
-                ["POLAR", 8, 125],
-            self.thumb_cluster.get_top_right(), # THUMB CLUSTER, TOP RIGHT
-                ["SHARP"],
-                ["SHARP"],
-            self.thumb_cluster.get_bottom_right(),
-        ]
-
-        self.bezier_curve = bezier_lines(casepoints, self.precision)
-
-
-    def panel_top(self):
-        return  self.get_key_position(self.rows-1,self.columns-1)[1] + self.keycap_size[1] + self.shell_offset
-    def panel_width(self):
-        return 24
-    def panel_height(self):
-        return 92
-    def panel_left(self):
-        return  self.get_key_position(0,self.columns-1)[0] + self.keycap_size[0]
-    def panel_right(self):
-        return  self.panel_left() + self.panel_width()
-
-    def get_key_position(self, row, col, center=False):
-        return sum_coords(
-            [self.keycap_size[0]/2, self.keycap_size[1]/2] if center else [0,0],
-            [self.shell_offset, self.shell_offset],
-            [
-                col * (self.switch_hole_size[0] + self.switch_hole_dist[0]),
-                row * (self.switch_hole_size[1] + self.switch_hole_dist[1]) + self.column_stagger[col],
-            ]
-        )
-
-    def get_shape_points(self):
-        return self.bezier_curve
-
-    def make_switch_holes(self):
-        res = square(0)
-        for row in range(0, self.rows):
-            for col in range(0, self.columns):
-                key_pos = self.get_key_position(row,  col,  center=True)
-                res += translate(key_pos)(square(self.switch_hole_size, center=True))
-        return res
-
-    def switches_positions(self):
-        res = []
-        for row in range(0, self.rows):
-            for col in range(0, self.columns):
-                key_pos = self.get_key_position(row,  col,  center=True)
-                res.append([key_pos, 0])
-        return res
-
 class WeightedDisc:
     disc_height=1.6
     disc_diam=35.3
     disc_hole_diam=8.4
 
-    def __init__(self, pos, number, extra_diam, disc_dist_from_bot, disc_dist_to_top):
+    def __init__(self, pos, number, extra_diam, disc_dist_from_bot, disc_dist_to_top, quality):
         self.pos = pos
         self.number_discs = number
         self.extra_diam = extra_diam
         self.disc_dist_from_bot = disc_dist_from_bot
         self.disc_dist_to_top = disc_dist_to_top
+        self.quality = quality
 
     def make_discs(self):
-        discs = cylinder(d=self.disc_diam, h=self.number_discs * self.disc_height, segments=60)
-        discs -= cylinder(d=self.disc_hole_diam, h=self.number_discs * self.disc_height, segments=60)
+        discs = cylinder(d=self.disc_diam, h=self.number_discs * self.disc_height, segments=self.quality.segments(self.disc_diam))
+        discs -= cylinder(d=self.disc_hole_diam, h=self.number_discs * self.disc_height, segments=self.quality.segments(self.disc_hole_diam))
         return translate([0,0,self.disc_dist_from_bot])(translate(self.pos)(discs))
 
     def get_diameter(self):
         return self.disc_diam + self.extra_diam
 
     def make_shape(self):
-        return translate(self.pos)(cylinder(d = self.disc_diam + self.extra_diam,
-            h = self.number_discs * self.disc_height + self.disc_dist_from_bot + self.disc_dist_to_top, segments=60))
+        return translate(self.pos)(cylinder(d = self.get_diameter(),
+            h = self.number_discs * self.disc_height + self.disc_dist_from_bot + self.disc_dist_to_top,
+            segments=self.quality.segments(self.get_diameter())))
 
 class Controller:
     board_width = 21
@@ -368,18 +93,19 @@ class Controller:
     board_edge_to_cable_shell = 2.5 # distance between board edge to cable shell
     usb_bottom_from_board_bottom = 0.5 # distance from board bottom to usb socket bottom
 
-    def __init__(self, pos, usb_top_height, total_height, pillar_diam, mirror):
+    def __init__(self, pos, usb_top_height, total_height, pillar_diam, mirror, quality):
         self.pos = pos
         self.mirror = mirror
         self.board_z_pos = usb_top_height - (self.usb_bottom_from_board_bottom + self.usb_height)
         self.total_height = total_height
         self.pillar_diam = pillar_diam
+        self.quality = quality
 
     def make_shape(self):
         board = cube([self.board_width, self.board_length, self.board_height])
         for x in [self.holes_dist_to_side_edge, self.board_width - self.holes_dist_to_side_edge]:
             for y in [self.holes_dist_to_top_edge, self.board_length - self.holes_dist_to_top_edge]:
-                board -= translate([x,y])(cylinder(d=self.holes_diam, h=self.board_height, segments=20))
+                board -= translate([x,y])(cylinder(d=self.holes_diam, h=self.board_height, segments=self.quality.segments(self.holes_diam)))
 
         usb = cube([self.usb_width, self.usb_length, self.usb_height])
         usb = translate([self.board_width/2-self.usb_width/2, 0])(usb)
@@ -396,7 +122,7 @@ class Controller:
         usb = translate([0, self.board_length - self.usb_length + self.usb_protursion])(usb)
         usb = translate([0,0,self.usb_bottom_from_board_bottom])(usb)
 
-        pin_hole = cylinder(d=self.pin_hole_diam, h=self.total_height - self.board_height - self.board_z_pos, segments = 10)
+        pin_hole = cylinder(d=self.pin_hole_diam, h=self.total_height - self.board_height - self.board_z_pos, segments=self.quality.segments(self.pin_hole_diam))
         pin_hole = translate([
                 self.button_dist_to_left if not self.mirror else self.board_width - self.button_dist_to_left,
                 self.board_length - self.button_dist_to_top,
@@ -413,16 +139,16 @@ class Controller:
         res = cube(0)
         for x in [self.holes_dist_to_side_edge, self.board_width - self.holes_dist_to_side_edge]:
             for y in [self.holes_dist_to_top_edge, self.board_length - self.holes_dist_to_top_edge]:
-                res += translate([x,y])(cylinder(d=self.pillar_diam, h=self.board_z_pos - layer_height, segments=20))
+                res += translate([x,y])(cylinder(d=self.pillar_diam, h=self.board_z_pos - layer_height, segments=self.quality.segments(self.pillar_diam)))
         return self.move_into_place(res, with_height = False)
 
     def make_top_support(self):
         res = cube(0)
         for x in [self.holes_dist_to_side_edge, self.board_width - self.holes_dist_to_side_edge]:
             for y in [self.holes_dist_to_top_edge, self.board_length - self.holes_dist_to_top_edge]:
-                res += translate([x,y])(cylinder(d=self.holes_diam, h=self.board_height, segments=20))
+                res += translate([x,y])(cylinder(d=self.holes_diam, h=self.board_height, segments=self.quality.segments(self.holes_diam)))
                 res += translate([x,y,self.board_height])(
-                    cylinder(d=self.pillar_diam, h=self.total_height - self.board_height - self.board_z_pos, segments=20))
+                    cylinder(d=self.pillar_diam, h=self.total_height - self.board_height - self.board_z_pos, segments=self.quality.segments(self.pillar_diam)))
         return self.move_into_place(res)
 
 class Screw:
@@ -439,10 +165,11 @@ class Screw:
     nut_diameter = 2.3094 * nut_flat_width / 2
     nut_holder_diameter =  1.2 * nut_diameter
 
-    def __init__(self, xy_pos, pillar_diam, z_elevation):
+    def __init__(self, xy_pos, pillar_diam, z_elevation, quality):
         self.xy_pos = xy_pos
         self.pillar_diam = pillar_diam
         self.z_elevation = z_elevation
+        self.quality = quality
 
     def make_top_hole(self):
         # add some bridging to make it possible to print above the nut hole
@@ -453,30 +180,30 @@ class Screw:
             square([self.thread_diameter, self.nut_diameter], center=True)))
         nut_hole += translate([0,0,nut_z_pos - 2 * layer_height])(linear_extrude(layer_height)(
             square([self.thread_diameter, self.thread_diameter], center=True)))
-        thread_hole = cylinder(d=self.thread_diameter, h=self.thread_height, segments=30)
+        thread_hole = cylinder(d=self.thread_diameter, h=self.thread_height, segments=self.quality.segments(self.thread_diameter))
         thread_hole = translate([0,0,self.z_elevation + self.head_height])(thread_hole)
         return translate(self.xy_pos)(nut_hole + thread_hole)
 
     def make_bot_hole(self):
         # use the same trick as in make_top_hole()
         head_hole_height = self.head_height + self.z_elevation
-        cyl = cylinder(d=self.head_diameter, h=head_hole_height, segments=30)
+        cyl = cylinder(d=self.head_diameter, h=head_hole_height, segments=self.quality.segments(self.head_diameter))
         cyl += up(head_hole_height)(linear_extrude(layer_height)(
             square([self.thread_diameter,self.head_diameter], center=True)))
         cyl += up(head_hole_height+layer_height)(linear_extrude(layer_height)(
             square([self.thread_diameter,self.thread_diameter], center=True)))
         cyl += translate([0,0,head_hole_height + 2 * layer_height])(
-            cylinder(d=self.thread_diameter, h=self.thread_height, segments=30))
+            cylinder(d=self.thread_diameter, h=self.thread_height, segments=self.quality.segments(self.thread_diameter)))
         return translate(self.xy_pos)(cyl)
 
     def make_top_shape(self):
-        cyl = cylinder(d = self.pillar_diam, h = self.thread_height - self.extra_support_height_bot - layer_height, segments=20)
+        cyl = cylinder(d = self.pillar_diam, h = self.thread_height - self.extra_support_height_bot - layer_height, segments=self.quality.segments(self.pillar_diam))
         cyl = translate([0,0,self.head_height + self.extra_support_height_bot + self.z_elevation + layer_height])(cyl)
         return translate(self.xy_pos)(cyl)
 
     def make_bot_shape(self):
         head_hole_height = self.head_height + self.z_elevation
-        cyl = cylinder(d=self.pillar_diam, h=head_hole_height + self.extra_support_height_bot, segments=20)
+        cyl = cylinder(d=self.pillar_diam, h=head_hole_height + self.extra_support_height_bot, segments=self.quality.segments(self.pillar_diam))
         return translate(self.xy_pos)(cyl)
 
 class JackSocket:
@@ -491,10 +218,11 @@ class JackSocket:
     hex_nut_diam = hex_nut_small_width * 2.3094 / 2
     hex_nut_height = 2
 
-    def __init__(self, pos, height, nut_offset):
+    def __init__(self, pos, height, nut_offset, quality):
         self.pos = pos
         self.height = height
         self.nut_offset = nut_offset
+        self.quality = quality
 
     def make_shape(self):
         res = cube(0)
@@ -502,13 +230,13 @@ class JackSocket:
             rotate([0,0,90])(cylinder(d=self.hex_nut_diam, h=self.hex_nut_height, segments=6))
         )
         res += translate([0,0,-self.outer_cyl_height])(
-            cylinder(d=self.outer_cyl_diam, h=self.outer_cyl_height, segments=30)
+            cylinder(d=self.outer_cyl_diam, h=self.outer_cyl_height, segments=self.quality.segments(self.outer_cyl_diam))
         )
         res += translate([0,0,0])(
-            cylinder(d=self.inner_cyl_1_diam, h=self.inner_cyl_1_height, segments=30)
+            cylinder(d=self.inner_cyl_1_diam, h=self.inner_cyl_1_height, segments=self.quality.segments(self.inner_cyl_1_diam))
         )
         res += translate([0,0,self.inner_cyl_1_height])(
-            cylinder(d=self.inner_cyl_2_diam, h=self.inner_cyl_2_height, segments=30)
+            cylinder(d=self.inner_cyl_2_diam, h=self.inner_cyl_2_height, segments=self.quality.segments(self.inner_cyl_2_diam))
         )
         res = rotate([0,-90,0])(res)
         res = translate(self.pos)(translate([0,0,self.height])(res))
@@ -519,7 +247,7 @@ class JackSocket:
             cylinder(
                 d=max(self.inner_cyl_1_diam, self.inner_cyl_2_diam),
                 h=self.inner_cyl_1_height + self.inner_cyl_2_height + self.outer_cyl_height + 1,
-                segments=40)
+                segments=self.quality.segments(max(self.inner_cyl_1_diam, self.inner_cyl_2_diam)))
         )
         res = rotate([0,-90,0])(res)
         res = translate(self.pos)(translate([0,0,self.height])(res))
@@ -531,13 +259,13 @@ class JackSocket:
         #    rotate([0,0,90])(cylinder(d=self.hex_nut_diam, h=self.hex_nut_height, segments=6))
         #)
         res += translate([0,0,-self.outer_cyl_height])(
-            cylinder(d=self.outer_cyl_diam, h=self.outer_cyl_height, segments=40)
+            cylinder(d=self.outer_cyl_diam, h=self.outer_cyl_height, segments=self.quality.segments(self.outer_cyl_diam))
         )
         res += translate([0,0,0])(
             cylinder(
                 d=max(self.inner_cyl_1_diam, self.inner_cyl_2_diam),
                 h=self.inner_cyl_1_height + self.inner_cyl_2_height + 1,
-                segments=40)
+                segments=self.quality.segments(max(self.inner_cyl_1_diam, self.inner_cyl_2_diam)))
         )
         res = rotate([0,-90,0])(res)
         res = translate(self.pos)(translate([0,0,self.height])(res))
@@ -547,29 +275,99 @@ class Support:
     switch_nub_depth = 5.2 # for kailh choc
     switch_nub_diameter = 2.5
 
-    def __init__(self, pos, height):
+    def __init__(self, pos, height, quality):
         self.pos = pos
         self.height = height
+        self.quality = quality
 
     def make_shape(self):
         return translate(self.pos)(
             cylinder(
                 d=self.switch_nub_diameter,
                 h=self.height - self.switch_nub_depth,
-                segments=20
+                segments=self.quality.segments(self.switch_nub_diameter)
             )
         )
 
-def make_channel(points, diam, segments):
-    prev = cube(0)
-    res = cube(0)
-    line = cube(0)
-    s = down(diam/2)(cylinder(d=diam, h=diam + eps, segments=15))
-    for p in range(len(points) - 1):
-        p1 = points[p]
-        p2 = points[p+1]
-        line += hull()(translate(p1)(s) + translate(p2)(s))
-    return line
+def convex_hull(points):
+    # Andrew's monotone chain, counter-clockwise
+    points = sorted(set(tuple(p) for p in points))
+    if len(points) <= 2:
+        return [list(p) for p in points]
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+    lower = []
+    upper = []
+    for p in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    for p in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+    return [list(p) for p in lower[:-1] + upper[:-1]]
+
+def sweep_polyhedron(path, profile, mitre_limit=4):
+    """Closed polyhedron sweeping the [lateral, z] polygon 'profile' along a path in the XY plane, with mitred joints."""
+    # drop repeated points, and points where the path folds back on itself (which would turn
+    # the polyhedron inside out), e.g. at the start of a curve whose handle points backwards
+    res = []
+    for p in np.asarray(path, dtype=float)[:, :2]:
+        while len(res) >= 2:
+            d1 = res[-1] - res[-2]
+            d2 = p - res[-1]
+            if np.dot(d1, d2) >= -0.7 * np.hypot(*d1) * np.hypot(*d2):
+                break
+            res.pop()
+        if not res or np.hypot(*(p - res[-1])) > eps:
+            res.append(p)
+    path = np.array(res)
+    if len(path) < 2:
+        raise ValueError("the path needs at least two distinct points")
+    profile = np.asarray(profile, dtype=float)
+
+    directions = path[1:] - path[:-1]
+    directions /= np.hypot(directions[:, 0], directions[:, 1])[:, np.newaxis]
+    normals = np.column_stack([-directions[:, 1], directions[:, 0]])
+    # normal of the segment before and after every vertex
+    before = np.vstack([normals[:1], normals])
+    after = np.vstack([normals, normals[-1:]])
+    mitres = before + after
+    lengths = np.hypot(mitres[:, 0], mitres[:, 1])
+    folded = lengths < eps
+    mitres[folded] = before[folded]
+    lengths[folded] = 1
+    mitres /= lengths[:, np.newaxis]
+    stretch = 1 / np.maximum(np.sum(mitres * before, axis=1), 1 / mitre_limit)
+
+    n = len(profile)
+    lateral = mitres * stretch[:, np.newaxis]
+    rings = path[:, np.newaxis, :] + profile[np.newaxis, :, 0, np.newaxis] * lateral[:, np.newaxis, :]
+    z = np.broadcast_to(profile[:, 1], rings.shape[:2])
+    points = np.dstack([rings, z]).reshape(-1, 3)
+
+    # OpenSCAD wants the faces clockwise when seen from the outside
+    faces = []
+    for i in range(len(path) - 1):
+        for j in range(n):
+            a = i * n + j
+            b = i * n + (j + 1) % n
+            faces.append([a, a + n, b + n])
+            faces.append([a, b + n, b])
+    last = (len(path) - 1) * n
+    faces.append(list(range(n)))
+    faces.append(list(range(last + n - 1, last - 1, -1)))
+    return polyhedron(points=points.tolist(), faces=faces, convexity=4)
+
+def make_channel(points, diam, segments=None):
+    """Groove of width and depth 'diam' along the path, round with 'segments' sides if given."""
+    if segments is not None:
+        angles = np.arange(segments) * 2 * math.pi / segments
+        profile = np.column_stack([np.cos(angles), np.sin(angles)]) * diam / 2
+    else:
+        profile = [[-diam/2, -diam/2], [diam/2, -diam/2], [diam/2, diam/2 + eps], [-diam/2, diam/2 + eps]]
+    return sweep_polyhedron(points, profile)
 
 class SolderingJig:
     mid_nub_diam = 3
@@ -584,10 +382,11 @@ class SolderingJig:
     diode_len = 3.5
     diode_wire_diam = .7
 
-    def __init__(self, switches_pos, type, choc):
+    def __init__(self, switches_pos, type, choc, quality):
         self.switches_pos = switches_pos
         self.type = type
         self.choc = choc
+        self.quality = quality
 
     def make_shape(self):
         plate_height = 3
@@ -598,34 +397,32 @@ class SolderingJig:
         if self.type == 'diode':
             res = cube([46, 10, 3])
             res += translate([0,10,0])(cube([8, 4, 4]))
-            res -= translate([0,12,2.2])(rotate([0,90,0])(cylinder(d=2, h=8,segments=20)))
-            diode = (rotate([-90,0,0])(cylinder(d=self.diode_diam, h=self.diode_len, segments=20)) +
-                rotate([90,0,0])(down(50)(cylinder(d=self.diode_wire_diam, h=100, segments=20)))
+            res -= translate([0,12,2.2])(rotate([0,90,0])(cylinder(d=2, h=8,segments=self.quality.segments(2))))
+            diode = (rotate([-90,0,0])(cylinder(d=self.diode_diam, h=self.diode_len, segments=self.quality.segments(self.diode_diam))) +
+                rotate([90,0,0])(down(50)(cylinder(d=self.diode_wire_diam, h=100, segments=self.quality.segments(self.diode_wire_diam))))
             )
 
             for i in range(6):
                 res -= translate([12 + i * 6, 5, plate_height])(diode)
             return res
 
-        prev_plate = None
-        for i in range(len(self.switches_pos)):
-            p = self.switches_pos[i]
-            plate = translate(p)(
-                (translate([-8,-7])(cube([7,14,plate_height])))
-                if self.type == 'vertical' else
-                translate([-7,-7])(cube([14,9,plate_height]))
-            )
-            if prev_plate:
-                plates += hull()(prev_plate + plate)
-            prev_plate = plate
+        # the plates are joined by the hull of consecutive pairs, all extruded at once
+        plate_outlines = []
+        for p in self.switches_pos:
+            corner, size = ([-8,-7], [7,14]) if self.type == 'vertical' else ([-7,-7], [14,9])
+            plate_outlines.append([Vec(p) + corner + [x, y] for x in [0, size[0]] for y in [0, size[1]]])
+        chain = square(0)
+        for i in range(1, len(plate_outlines)):
+            chain += polygon(points=convex_hull(plate_outlines[i-1] + plate_outlines[i]))
+        plates += linear_extrude(height=plate_height)(chain)
 
         if self.type == 'vertical':
             for i in range(len(self.switches_pos)):
                 p = self.switches_pos[i]
                 pos = [-self.left_pin_x_dist, self.left_pin_y_dist]
                 channel += translate(p)(translate(pos)(down(self.wire_diam/2)(
-                    cylinder(d=3, h=self.wire_diam+eps, segments=20))))
-                holes += translate(p)(translate(pos)(cylinder(d=1.7, h=100, segments=20)))
+                    cylinder(d=3, h=self.wire_diam+eps, segments=self.quality.segments(3)))))
+                holes += translate(p)(translate(pos)(cylinder(d=1.7, h=100, segments=self.quality.segments(1.7))))
         elif self.type == 'horizontal':
             for i in range(len(self.switches_pos)):
                 p = self.switches_pos[i]
@@ -635,101 +432,144 @@ class SolderingJig:
                 holes += translate(p)(translate([4-4/2,-10])(
                     cube([4,7.5,plate_height])))
                 channel += translate(p)(translate(pos)(rotate([90,0,0])(
-                    down(50)(cylinder(d=1.8, h=100, segments=20)))))
+                    down(50)(cylinder(d=1.8, h=100, segments=self.quality.segments(1.8))))))
 
         wire_curve_points = []
         for i in range(len(self.switches_pos)):
-            p = self.switches_pos[i]
+            p = Vec(self.switches_pos[i])
             if self.type == 'vertical':
                 if i == 0:
-                    wire_curve_points.append(sum_coords(p, [-8, -3]))
+                    wire_curve_points.append(p + [-8, -3])
                     wire_curve_points.append(["SHARP"])
                     wire_curve_points.append(["RELATIVE", 0, -2])
                 else:
                     wire_curve_points.append(["SHARP"])
                     wire_curve_points.append(["SHARP"])
-                wire_curve_points.append(sum_coords(p, [-self.aux_nub_dist +self.aux_nub_diam/2 + self.wire_diam/2, 0]))
+                wire_curve_points.append(p + [-self.aux_nub_dist +self.aux_nub_diam/2 + self.wire_diam/2, 0])
                 wire_curve_points.append(["RELATIVE", 0, 1])
                 wire_curve_points.append(["RELATIVE", 0, -1])
-                wire_curve_points.append(sum_coords(p, [-self.left_pin_x_dist-.4, self.left_pin_y_dist]))
+                wire_curve_points.append(p + [-self.left_pin_x_dist-.4, self.left_pin_y_dist])
                 if i == len(self.switches_pos) - 1:
                     wire_curve_points.append(["SHARP"])
                     wire_curve_points.append(["SHARP"])
-                    wire_curve_points.append(sum_coords(p, [-5,7]))
+                    wire_curve_points.append(p + [-5,7])
             elif self.type == 'horizontal':
                 if i == 0:
-                    wire_curve_points.append(sum_coords(p, [-7, -4]))
+                    wire_curve_points.append(p + [-7, -4])
                     wire_curve_points.append(["SHARP"])
                 wire_curve_points.append(["RELATIVE", -12, 0])
-                wire_curve_points.append(sum_coords(p, [4, -4]))
+                wire_curve_points.append(p + [4, -4])
                 wire_curve_points.append(["RELATIVE", 12, 0])
                 if i == len(self.switches_pos) - 1:
                     wire_curve_points.append(["SHARP"])
-                    wire_curve_points.append(sum_coords(p, [7, -4]))
+                    wire_curve_points.append(p + [7, -4])
 
-        channel += make_channel(bezier_lines(wire_curve_points, 0.1), diam = self.wire_diam, segments=20)
+        channel += make_channel(bezier_lines(wire_curve_points, 0.1), diam = self.wire_diam)
 
         channel = up(plate_height)(channel)
         channel = down(self.wire_diam/2)(channel)
         #holes = holes + up(.2)(holes) + up(.4)(holes)
         return (plates - channel - holes)
 
-def make_top_and_bot(
-        shape_no_holes,
-        top_shape,
-        top_height,
-        top_things,
-        top_holes,
-        bot_shape,
-        bot_height,
-        bot_things,
-        bot_holes,
-        wall_full_width,
-        wall_outer_width,
-        bottom_recess,
-        height,
-    ):
-    bot_shape = offset(delta=-wall_outer_width)(bot_shape)
+class Outline:
+    """2D shape computed in python with shapely instead of by OpenSCAD."""
+    def __init__(self, geometry):
+        self.geometry = geometry
+
+    @staticmethod
+    def from_points(points):
+        from shapely.geometry import Polygon
+        return Outline(Polygon(points).buffer(0))
+
+    @staticmethod
+    def from_polygons(polygons):
+        from shapely.geometry import Polygon
+        from shapely.ops import unary_union
+        return Outline(unary_union([Polygon(p).buffer(0) for p in polygons]))
+
+    def offset(self, r=None, delta=None, segments=20):
+        # same semantics as OpenSCAD's offset(): 'r' rounds the corners, 'delta' keeps them sharp
+        if r is not None:
+            return Outline(self.geometry.buffer(r, quad_segs=max(segments // 4, 1), join_style='round'))
+        return Outline(self.geometry.buffer(delta, join_style='mitre', mitre_limit=1000))
+
+    def __add__(self, other):
+        return Outline(self.geometry.union(other.geometry))
+
+    def __sub__(self, other):
+        return Outline(self.geometry.difference(other.geometry))
+
+    def polygons(self):
+        geometry = self.geometry
+        return list(geometry.geoms) if hasattr(geometry, 'geoms') else [geometry]
+
+    def rings(self):
+        res = []
+        for poly in self.polygons():
+            for ring in [poly.exterior] + list(poly.interiors):
+                res.append([list(c) for c in ring.coords[:-1]])
+        return res
+
+    def area(self):
+        return self.geometry.area
+
+    def vertex_count(self):
+        return sum(len(ring) for ring in self.rings())
+
+    def to_scad(self):
+        points = []
+        paths = []
+        for ring in self.rings():
+            paths.append(list(range(len(points), len(points) + len(ring))))
+            points += ring
+        return polygon(points=points, paths=paths, convexity=4)
+
+def offset2d(shape, r=None, delta=None, segments=None):
+    if isinstance(shape, Outline):
+        return shape.offset(r=r, delta=delta, segments=segments or 20)
+    if r is not None:
+        return offset(r=r, segments=segments)(shape)
+    return offset(delta=delta)(shape)
+
+def scad2d(shape):
+    return shape.to_scad() if isinstance(shape, Outline) else shape
+
+def make_flat_shapes(shape_no_holes, top_shape, wall_full_width, wall_outer_width, bottom_recess):
+    """The 2D shapes extruded into the top and bottom parts, SCAD objects or Outlines."""
+    bot_shape = offset2d(shape_no_holes, delta=-wall_outer_width)
+    wall_shape = shape_no_holes - offset2d(shape_no_holes, delta=-wall_full_width)
+    return {
+        'top': top_shape,
+        'wall': wall_shape,
+        'outer_wall': shape_no_holes - bot_shape,
+        'bot': bot_shape,
+        'bot_recessed': offset2d(bot_shape, delta=-bottom_recess),
+    }
+
+def make_bot_body(flat_shapes, bot_height, bot_things, bot_holes, height):
+    # the bottom part before the recess, the wall of the top part is cut around it
+    bot_shape = scad2d(flat_shapes['bot'])
     bot = linear_extrude(height=bot_height, convexity=2)(bot_shape)
     bot += bot_things
     bot -= bot_holes
     bot *= linear_extrude(height=height, convexity=2)(bot_shape) # cut off protruding things (screws, for example
+    return bot
 
-    wall = linear_extrude(height=height, convexity=2)(
-        shape_no_holes - offset(delta=-wall_full_width)(shape_no_holes))
+def make_top(flat_shapes, bot_body, top_height, top_things, top_holes, height):
+    wall = linear_extrude(height=height, convexity=2)(scad2d(flat_shapes['wall']))
 
-    top = linear_extrude(height=top_height, convexity=2)(top_shape)
+    top = linear_extrude(height=top_height, convexity=2)(scad2d(flat_shapes['top']))
     top = translate([0,0,height-top_height])(top)
-    top += (wall - bot) # make sure that the wall does not overlap with the bottom
+    top += (wall - bot_body) # make sure that the wall does not overlap with the bottom
     top += top_things
     top -= top_holes
     #top -= bot_holes
-    bot *= linear_extrude(height=height, convexity=2)(offset(delta=-bottom_recess)(bot_shape))
+    return top
 
-    return top, bot
-
-def main() -> int:
-    shell_offset = 1 # the 'border'
-    keycap_dist = [1,1]
-    switch_hole_size = [13.7,13.7]
-    thumb_keycap_spacing = .4
-    height = 10 # total height, including bot and top plates
-    top_height = 2
-    bot_height = 2
-    wall_inner_width = 1 # the bottom plate is below the 'inner' wall
-    wall_outer_width = 1 # but not below the out wall, which encloses it
-    bottom_recess = 0.04 # shrink the bottom plate by this much all around, so that the fit is
-                         # not as tight
-    rows = 4
-    columns = 6
-    column_stagger = [0, 0, 4.5, 9, 4.5, 18 * .15]
-    thumb_cluster_key_count = 4
-    roundness = 1
-    precision = 0.01
-    right_hand = True
-    choc_switches = True
-    keycap_size = [18,17 if choc_switches else 18]
+def make_bot(flat_shapes, bot_body, height):
+    return bot_body * linear_extrude(height=height, convexity=2)(scad2d(flat_shapes['bot_recessed']))
 
+def make_switch_and_keycap(choc_switches):
     choc_shape = (cube(0)
         + translate([-7,-7,-2.2])(cube([14,14,2.2])) # bottom
         + translate([-7.5,-7.5,0])(cube([15,15,.8])) # lip
@@ -750,208 +590,764 @@ def main() -> int:
             + translate([-12/2,-12/2,8])(cube([12,12,eps]))
             )) # cap
     )
-    switch_and_keycap = choc_shape if choc_switches else mx_shape
-
-    tc = ThumbCluster(
-        key_count = thumb_cluster_key_count,
-        #bezier_points = [ [0,0], ["POLAR", 3, -5], ["POLAR", 3, 125], [7,-4] ],
-         bezier_points = [ [0,0], ["POLAR", 30, -5], ["POLAR", 30, 122], [67.5,-42.5] ],
-        #bezier_points = [ [0,0], ["POLAR", 3, -5], ["POLAR", 3, 120], [6.5,-4.5] ],
-        #bezier_points = [ [0,0], ["POLAR", 3, -10], ["POLAR", 2, 115], [5.5,-4.5] ],
-        keycap_size = keycap_size,
-        keycap_spacing = thumb_keycap_spacing,
-        switch_hole_size = switch_hole_size,
-        #position = [77, -12.5],
-         position = [77, -14],
-        offset = shell_offset,
-        precision = precision,
-    )
+    return choc_shape if choc_switches else mx_shape
 
-    sh = Shell(rows = rows,
-        columns = columns,
-        keycap_size = keycap_size,
-        keycap_dist = keycap_dist,
-        switch_hole_size = switch_hole_size,
-        thumb_cluster = tc,
-        column_stagger = column_stagger,
-        shell_offset = shell_offset,
-        precision = precision,
-    )
+def make_color_layers(outer_wall, bands):
+    """One part per (z, height, color) band of the outer wall."""
+    strip = scad2d(offset2d(outer_wall, r=10 * eps))
+    res = []
+    for z, height, band_color in bands:
+        layer = linear_extrude(height)(strip)
+        res.append(color(band_color)(up(z)(layer) if z else layer))
+    return res
+
+# the parameters read by make_components, besides those of the shell
+component_parameters = ['height', 'wall_outer_width', 'wall_inner_width', 'top_height', 'controller_pillar_diam',
+    'thumb_cluster_key_count', 'screws', 'screw_pillar_diam', 'screw_z_elevation', 'weights', 'weight_disc_count',
+    'weight_extra_diam', 'auto_screws', 'auto_weights', 'placement_step']
+
+def make_components(params, right_hand=True, quality=None, shell=None):
+    """The components of the case, as a dict, with their round shapes cut according to 'quality'."""
+    quality = quality or quality_tier('preview')
+    height = params['height']
+    wall_full_width = params['wall_outer_width'] + params['wall_inner_width']
 
-    wall_full_width=wall_outer_width + wall_inner_width
+    tc, sh = shell or make_shell(params)
 
     jack = JackSocket(
-        pos = [sh.panel_right() - wall_full_width , 6],
+        pos = jack_position(params, sh),
         height = height/2,
         nut_offset = wall_full_width,
+        quality = quality,
     )
 
     controller = Controller(
-        pos = [sh.panel_right() - wall_full_width,sh.panel_top()],
-        usb_top_height = height - top_height,
+        pos = controller_position(params, sh),
+        usb_top_height = height - params['top_height'],
         total_height = height,
-        pillar_diam = 4,
+        pillar_diam = params['controller_pillar_diam'],
         mirror = right_hand,
+        quality = quality,
     )
 
-    weights = []
-    for pos in [
-        [22,20], [22, 56],
-        [60,21], [60, 60],
-        [98,10],
-        #[98,55], # maybe?
-    ]:
-        weights.append(WeightedDisc(
+    supports = []
+    for pos in sh.layout.centers.tolist():
+        supports.append(Support(pos = pos, height = height, quality = quality))
+    for c in range(params['thumb_cluster_key_count']):
+        pos = tc.get_key_coord(c)[0]
+        supports.append(Support(pos = pos, height = height, quality = quality))
+
+    components = {
+        'thumb_cluster': tc,
+        'shell': sh,
+        'jack': jack,
+        'controller': controller,
+        'weights': [],
+        'screws': [],
+        'supports': supports,
+        'quality': quality,
+    }
+
+    # the screws are placed first, the weights go around them
+    if params['auto_screws'] or params['auto_weights']:
+        grid = outline_grid(case_outline(components), params['placement_step'])
+    screw_positions = params['screws']
+    if params['auto_screws']:
+        screw_positions = place_screws(params, components, grid)
+    for pos in screw_positions:
+        components['screws'].append(Screw(
+            xy_pos = pos,
+            pillar_diam = params['screw_pillar_diam'],
+            z_elevation = params['screw_z_elevation'],
+            quality = quality))
+
+    weight_positions = params['weights']
+    if params['auto_weights']:
+        weight_positions = place_weights(params, components, grid)
+    for pos in weight_positions:
+        components['weights'].append(WeightedDisc(
             pos = pos,
-            number = 1,
-            extra_diam = 2,
+            number = params['weight_disc_count'],
+            extra_diam = params['weight_extra_diam'],
             disc_dist_from_bot = 0.4,
-            disc_dist_to_top = 0.4))
-
-    screws = []
-    for pos in [
-        [40,4],      # bot left
-        [35,74],     # top left
-        [77.5,78.2], # top right
-        [132,17],    # bot right
-        [133,-19],   # bot right
-    ]:
-        screws.append(Screw(
-            xy_pos = pos,
-            pillar_diam = 7,
-            z_elevation = 1))
+            disc_dist_to_top = 0.4,
+            quality = quality))
+
+    return components
+
+def case_outline(components):
+    return components['shell'].get_outline_points()
+
+def place_screws(params, components, grid):
+    """Spread 'auto_screws' screws in the case, away from the other components."""
+    diameter = params['screw_pillar_diam']
+    screw_height = params['screw_z_elevation'] + Screw.head_height + Screw.thread_height
+    # the pillars can be merged with the wall, but the head holes must not go through it
+    wall = max(diameter / 2, Screw.head_diameter / 2 + params['wall_outer_width'])
+    candidates = candidate_positions(grid, make_footprints(params, components), diameter, (0, screw_height), wall)
+    return place_spread(candidates, params['auto_screws'], diameter, what="screws")
+
+def place_weights(params, components, grid):
+    """Place 'auto_weights' weights in the case, with their center of mass close to its center."""
+    diameter = WeightedDisc.disc_diam + params['weight_extra_diam']
+    # the holder has 0.4 below and above the discs
+    weight_height = params['weight_disc_count'] * WeightedDisc.disc_height + 0.8
+    keep_out = [f for f in make_footprints(params, components) if f.kind != 'support']
+    wall = WeightedDisc.disc_diam / 2 + params['wall_outer_width']
+    candidates = candidate_positions(grid, keep_out, diameter, (0, weight_height), wall)
+    return place_balanced(candidates, params['auto_weights'], diameter, outline_centroid(case_outline(components)),
+        what="weights")
+
+def make_footprints(params, components):
+    """The footprints of every component, for check_interference()."""
+    height = params['height']
+    wall_outer_width = params['wall_outer_width']
+    wall_full_width = wall_outer_width + params['wall_inner_width']
+    tc = components['thumb_cluster']
+    sh = components['shell']
+    res = []
 
-    supports = []
-    for row in range(rows):
-        for col in range(columns):
-            supports.append(Support(
-                pos = sh.get_key_position(row = row, col = col, center=True),
-                height = height,
-            ))
-    for c in range(thumb_cluster_key_count):
-        pos = tc.get_key_coord(c)[0]
-        supports.append(Support(pos = pos, height = height))
+    # the switches go down to where the supports stop
+    switch_z = (height - Support.switch_nub_depth, height)
+    for i, points in enumerate(sh.switch_hole_polygons()):
+        res.append(Footprint.polygon(f"switch {i}", switch_z, points, wall=wall_full_width))
+    for i, points in enumerate(tc.switch_hole_polygons()):
+        res.append(Footprint.polygon(f"thumb switch {i}", switch_z, points, wall=wall_full_width))
+
+    for i, support in enumerate(components['supports']):
+        res.append(Footprint.circle(f"support {i}", (0, height - support.switch_nub_depth),
+            support.pos, support.switch_nub_diameter))
+
+    for i, weight in enumerate(components['weights']):
+        discs_height = weight.number_discs * weight.disc_height
+        res.append(Footprint.circle(f"weight {i}", (weight.disc_dist_from_bot, weight.disc_dist_from_bot + discs_height),
+            weight.pos, weight.disc_diam, wall=wall_outer_width))
+
+    for i, screw in enumerate(components['screws']):
+        screw_height = screw.z_elevation + screw.head_height + screw.thread_height
+        res.append(Footprint.circle(f"screw {i}", (0, screw_height), screw.xy_pos, screw.pillar_diam))
+        res.append(Footprint.circle(f"screw {i} head", (0, screw.z_elevation + screw.head_height),
+            screw.xy_pos, screw.head_diameter, kind="screw", group=f"screw {i}", wall=wall_outer_width))
+
+    controller = components['controller']
+    left = controller.pos[0] - controller.board_width
+    bottom = controller.pos[1] - controller.board_length - controller.board_edge_to_cable_shell
+    res.append(Footprint.polygon("controller",
+        (controller.board_z_pos, controller.board_z_pos + controller.usb_bottom_from_board_bottom + controller.usb_height),
+        rect_points([left + controller.board_width / 2, bottom + controller.board_length / 2],
+            [controller.board_width, controller.board_length]),
+        wall=wall_full_width))
+    for x in [controller.holes_dist_to_side_edge, controller.board_width - controller.holes_dist_to_side_edge]:
+        for y in [controller.holes_dist_to_top_edge, controller.board_length - controller.holes_dist_to_top_edge]:
+            res.append(Footprint.circle("controller pillar", (0, controller.total_height),
+                [left + x, bottom + y], controller.pillar_diam, group="controller"))
+
+    # the socket is horizontal, its body is inside the case and the thread goes through the wall
+    jack = components['jack']
+    jack_diam = max(jack.inner_cyl_1_diam, jack.inner_cyl_2_diam)
+    jack_length = jack.inner_cyl_1_height + jack.inner_cyl_2_height
+    res.append(Footprint.polygon("jack", (jack.height - jack_diam / 2, jack.height + jack_diam / 2),
+        rect_points([jack.pos[0] - jack_length / 2, jack.pos[1]], [jack_length, jack_diam]),
+        wall=wall_full_width))
+    return res
 
-    shape = polygon(points = sh.get_shape_points() + tc.get_shape_points(), convexity=4)
+def check_components(params, components=None):
+    if components is None:
+        components = make_components(params)
+    outline = case_outline(components)
+    # the supports stand on the weights, the discs are inserted around them during the print
+    problems = check_interference(make_footprints(params, components), outline,
+        allowed=[('support', 'weight')])
+    return problems + [(kind, ('outline',), index) for kind, index in outline_defects(outline)]
+
+black = "#404040"
+white = "#ffffff"
+beige = "#eadebb"
+gold = "#ffdf00"
+gray = "#c9c9c9"
+dark_gray = "#9a9a9a"
+color_shell = black
+color_middle_shell = beige
+color_bottom_shell = black
+color_alnum_keys = white
+color_other_keys = gray
+
+def make_outline(params, shell):
+    tc, sh = shell
+    if params['outline_kernel']:
+        shape = Outline.from_points(sh.get_outline_points())
+    else:
+        shape = polygon(points = sh.get_outline_points(), convexity=4)
+    roundness = params['roundness']
     if roundness > 0:
-        shape = offset(r=roundness,segments=20)(offset(r=-roundness,segments=20)(shape))
-
-    top_things = cube(0)
-    top_things += controller.make_top_support()
-    for screw in screws:
-        top_things += screw.make_top_shape()
-
-    top_holes = cube(0)
-    top_holes += jack.make_top_hole()
-    top_holes += controller.make_top_hole()
-    for screw in screws:
-        top_holes += screw.make_top_hole()
-
-    bot_things = cube(0)
-    for weight in weights:
-        bot_things += weight.make_shape()
-    for screw in screws:
-        bot_things += screw.make_bot_shape()
-    for support in supports:
-        bot_things += support.make_shape()
-    bot_things += controller.make_bottom_support()
-
-    bot_holes = cube(0)
-    bot_holes += jack.make_bot_hole()
-    for weight in weights:
-        bot_holes += weight.make_discs()
-    for screw in screws:
-        bot_holes += screw.make_bot_hole()
-
-    top, bot = make_top_and_bot(
-        shape_no_holes = shape,
-        top_shape = shape - (tc.make_switch_holes() + sh.make_switch_holes()),
-        top_things = top_things,
-        top_holes = top_holes,
-        bot_shape = shape,
-        bot_things = bot_things,
-        bot_holes = bot_holes,
-        wall_full_width = wall_full_width,
-        wall_outer_width = wall_outer_width,
-        top_height = top_height,
-        bot_height = bot_height,
-        bottom_recess = bottom_recess,
-        height = height,
-    )
+        segments = quality_tier(params['quality']).segments(2 * roundness)
+        shape = offset2d(offset2d(shape, r=-roundness, segments=segments), r=roundness, segments=segments)
+    return shape
+
+def make_switch_holes(params, shell):
+    tc, sh = shell
+    if params['outline_kernel']:
+        return Outline.from_polygons(tc.switch_hole_polygons() + sh.switch_hole_polygons())
+    return tc.make_switch_holes() + sh.make_switch_holes()
+
+def top_features(components):
+    """What is added to and cut from the top part, as lists of (footprint group, SCAD object)."""
+    controller = components['controller']
+    screws = list(enumerate(components['screws']))
+    things = [('controller', controller.make_top_support())]
+    things += [(f"screw {i}", screw.make_top_shape()) for i, screw in screws]
+    holes = [('jack', components['jack'].make_top_hole()), ('controller', controller.make_top_hole())]
+    holes += [(f"screw {i}", screw.make_top_hole()) for i, screw in screws]
+    return things, holes
+
+def bot_features(components):
+    weights = list(enumerate(components['weights']))
+    screws = list(enumerate(components['screws']))
+    things = [(f"weight {i}", weight.make_shape()) for i, weight in weights]
+    things += [(f"screw {i}", screw.make_bot_shape()) for i, screw in screws]
+    things += [(f"support {i}", support.make_shape()) for i, support in enumerate(components['supports'])]
+    things += [('controller', components['controller'].make_bottom_support())]
+    holes = [('jack', components['jack'].make_bot_hole())]
+    holes += [(f"weight {i}", weight.make_discs()) for i, weight in weights]
+    holes += [(f"screw {i}", screw.make_bot_hole()) for i, screw in screws]
+    return things, holes
+
+def union_of(features):
+    res = cube(0)
+    for _, obj in features:
+        res += obj
+    return res
 
+def make_keys(shell, choc_switches, height):
+    tc, sh = shell
+    switch_and_keycap = make_switch_and_keycap(choc_switches)
     alphanum_keys = cube(0)
     other_keys = cube(0)
     for i, pos in enumerate(sh.switches_positions()):
         key = up(height)(translate(pos[0])(rotate([0,0,pos[1]])(switch_and_keycap)))
-        if i % 6 == 0:
+        if sh.layout.flags[i] & OTHER_KEY:
             other_keys += key
         else:
             alphanum_keys += key
     for pos in tc.switches_positions():
         other_keys += up(height)(translate(pos[0])(rotate([0,0,pos[1]])(switch_and_keycap)))
+    return color(color_alnum_keys)(alphanum_keys) + color(color_other_keys)(other_keys)
+
+def make_phantoms(components):
     phantoms = cube(0)
-    phantoms += controller.make_shape()
-    phantoms += jack.make_shape()
-
-    black = "#404040"
-    white = "#ffffff"
-    beige = "#eadebb"
-    gold = "#ffdf00"
-    gray = "#c9c9c9"
-    dark_gray = "#9a9a9a"
-    color_shell = black
-    color_middle_shell = beige
-    color_bottom_shell = black
-    color_alnum_keys = white
-    color_other_keys = gray
-
-    color_strip_height = 1.4
-    top = color(color_shell)(top)
-    top_middle = color(color_middle_shell)(up(color_strip_height)(linear_extrude(height - 2 * color_strip_height)(
-        offset(r=10 * eps)(projection(cut=True)(top)))))
-    top_bottom = color(color_bottom_shell)(linear_extrude(color_strip_height)(offset(r=10 * eps)(projection(cut=True)(top))))
-    bot = color(color_bottom_shell)(bot)
-    keys = color(color_alnum_keys)(alphanum_keys) + color(color_other_keys)(other_keys)
-    phantoms = color(gray)(phantoms)
-
-    phantoms = phantoms.set_modifier('%')
-    keys = keys.set_modifier('%')
-
-    out = (cube(0)
-         + top
-         + top_middle
-         + top_bottom
-         #+ bot
-         + phantoms
-         + keys
-    )
+    phantoms += components['controller'].make_shape()
+    phantoms += components['jack'].make_shape()
+    return color(gray)(phantoms)
+
+def make_jig(params, switches_pos, type):
+    return SolderingJig(
+        switches_pos = switches_pos,
+        type = type,
+        choc = params['choc_switches'],
+        quality = quality_tier(params['quality']),
+    ).make_shape()
+
+def part_graph():
+    """The parts of the keyboard and what they are made of, as a graph of targets (see targets.py)."""
+    def mirrored(p, part):
+        return scale([-1,1,1])(part) if p['right_hand'] else part
+    def strips(p, flat_shapes):
+        strip_height = p['color_strip_height']
+        return make_color_layers(flat_shapes['outer_wall'], [
+            (0, strip_height, color_bottom_shell),
+            (strip_height, p['height'] - 2 * strip_height, color_middle_shell),
+        ])
+    def line(sh, **kwargs):
+        return sh.layout.centers[sh.layout.line(**kwargs)].tolist()
+
+    return TargetGraph([
+        # the layout file may be saved again under the same name
+        Target('shell', make_shell, shell_parameters + ['layout_stamp']),
+        Target('components', lambda p, shell: make_components(p, p['right_hand'], quality_tier(p['quality']), shell),
+            component_parameters + ['right_hand', 'quality'], ['shell']),
+        Target('outline', make_outline, ['outline_kernel', 'roundness', 'quality'], ['shell']),
+        Target('switch_holes', make_switch_holes, ['outline_kernel'], ['shell']),
+        Target('flat_shapes', lambda p, shape, switch_holes: make_flat_shapes(shape, shape - switch_holes,
+                p['wall_outer_width'] + p['wall_inner_width'], p['wall_outer_width'], p['bottom_recess']),
+            ['wall_outer_width', 'wall_inner_width', 'bottom_recess'], ['outline', 'switch_holes']),
+        Target('bot_body', lambda p, flat_shapes, components: make_bot_body(flat_shapes, p['bot_height'],
+                *map(union_of, bot_features(components)), p['height']),
+            ['bot_height', 'height'], ['flat_shapes', 'components']),
+        Target('top', lambda p, flat_shapes, components, bot_body: mirrored(p, color(color_shell)(
+                make_top(flat_shapes, bot_body, p['top_height'], *map(union_of, top_features(components)), p['height']))),
+            ['top_height', 'height', 'right_hand'], ['flat_shapes', 'components', 'bot_body']),
+        Target('bot', lambda p, flat_shapes, bot_body: mirrored(p, color(color_bottom_shell)(
+                make_bot(flat_shapes, bot_body, p['height']))),
+            ['height', 'right_hand'], ['flat_shapes', 'bot_body']),
+        Target('color_strips', strips, ['color_strip_height', 'height'], ['flat_shapes']),
+        Target('top_bottom', lambda p, layers: mirrored(p, layers[0]), ['right_hand'], ['color_strips']),
+        Target('top_middle', lambda p, layers: mirrored(p, layers[1]), ['right_hand'], ['color_strips']),
+        Target('phantoms', lambda p, components: mirrored(p, make_phantoms(components)), ['right_hand'], ['components']),
+        Target('keys', lambda p, shell: mirrored(p, make_keys(shell, p['choc_switches'], p['height'])),
+            ['choc_switches', 'height', 'right_hand'], ['shell']),
+        # the jigs are not mirrored
+        Target('jig_vertical', lambda p, shell: make_jig(p, line(shell[1], col = 0), 'vertical'),
+            ['choc_switches', 'quality'], ['shell']),
+        Target('jig_horizontal', lambda p, shell: make_jig(p, line(shell[1], row = 0), 'horizontal'),
+            ['choc_switches', 'quality'], ['shell']),
+        Target('jig_diode', lambda p: make_jig(p, [], 'diode'), ['choc_switches', 'quality']),
+    ])
+
+part_names = ['top', 'top_middle', 'top_bottom', 'bot', 'phantoms', 'keys', 'jig_vertical', 'jig_horizontal', 'jig_diode']
+
+def make_parts(params=None, right_hand=True, verbose=False, components=None, quality=None, names=None, graph=None):
+    """The parts in 'names' (all by default) as SCAD objects, only rebuilding what changed in 'graph'."""
+    if params is None:
+        params = default_parameters()
+    if graph is None:
+        graph = part_graph()
+    given = {}
+    if components is not None:
+        quality = components['quality']
+        given = {'components': components, 'shell': (components['thumb_cluster'], components['shell'])}
+    quality = quality or quality_tier('preview')
+
+    parts = graph.evaluate(names or part_names,
+        dict(params, right_hand=right_hand, quality=quality.name, layout_stamp=layout_stamp(params)), given)
+    if verbose:
+        if 'shell' in graph.values:
+            print("outline vertices per segment:", graph.values['shell'][1].outline_vertex_counts, file=sys.stderr)
+        if params['outline_kernel'] and 'flat_shapes' in graph.values:
+            for name, flat in graph.values['flat_shapes'].items():
+                print(f"{name}: area {flat.area():.2f} mm2, {flat.vertex_count()} vertices", file=sys.stderr)
+    return parts
+
+def grid_size(count, width, height):
+    # columns and rows of a grid of about 'count' cells, as square as possible
+    columns = max(1, min(count, round(math.sqrt(count * width / height))))
+    return columns, math.ceil(count / columns)
+
+def cut_positions(start, end, count, avoid, clearance=0.01):
+    # evenly spaced cuts, moved away from the coordinates in 'avoid'
+    avoid = np.asarray(avoid, dtype=float)
+    res = []
+    for i in range(1, count):
+        c = round(float(start + (end - start) * i / count), 3)
+        while np.any(np.abs(avoid - c) < clearance):
+            c = round(c + 0.013, 3)
+        res.append(c)
+    return res
 
+def polygon_meets_rect(points, rect):
+    x0, y0, x1, y1 = rect
+    points = np.asarray(points, dtype=float)
+    if np.any((points[:, 0] >= x0) & (points[:, 0] <= x1) & (points[:, 1] >= y0) & (points[:, 1] <= y1)):
+        return True
+    starts, ends = polygon_edges(points)
+    if contains(starts, ends, [x0, y0])[0]:
+        return True
+    # otherwise one of the edges must cross the rectangle, clip them to it (Liang-Barsky)
+    d = ends - starts
+    t0 = np.zeros(len(d))
+    t1 = np.ones(len(d))
+    crossing = np.ones(len(d), dtype=bool)
+    for p, q in [(-d[:, 0], starts[:, 0] - x0), (d[:, 0], x1 - starts[:, 0]),
+            (-d[:, 1], starts[:, 1] - y0), (d[:, 1], y1 - starts[:, 1])]:
+        crossing &= (p != 0) | (q >= 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = q / p
+        t0 = np.where(p < 0, np.maximum(t0, r), t0)
+        t1 = np.where(p > 0, np.minimum(t1, r), t1)
+    return bool(np.any(crossing & (t0 <= t1)))
+
+def make_top_tiles(params, right_hand=True, quality=None, count=None, margin=10, graph=None):
+    """The top part cut into about 'count' tiles, to render in parallel, and the positions of the cuts."""
+    if graph is None:
+        graph = part_graph()
+    quality = quality or quality_tier('preview')
+    values = graph.evaluate(['outline', 'flat_shapes', 'components'],
+        dict(params, right_hand=right_hand, quality=quality.name, layout_stamp=layout_stamp(params)))
+    components = values['components']
+    flat_shapes = values['flat_shapes']
+    height = params['height']
+    wall_outer_width = params['wall_outer_width']
+    wall_full_width = wall_outer_width + params['wall_inner_width']
+
+    footprints = make_footprints(params, components)
+    switches = [f for f in footprints if f.kind in ['switch', 'thumb']]
+    group_bboxes = {}
+    for f in footprints:
+        bbox = f.bbox()
+        old = group_bboxes.get(f.group, bbox)
+        group_bboxes[f.group] = (min(old[0], bbox[0]), min(old[1], bbox[1]), max(old[2], bbox[2]), max(old[3], bbox[3]))
+
+    # the features of the top part, and of the bottom one which is cut out of its wall
+    top_things, top_holes = top_features(components)
+    bot_things, bot_holes = bot_features(components)
+    features = {'top_things': top_things, 'top_holes': top_holes, 'bot_things': bot_things, 'bot_holes': bot_holes}
+    index = GridIndex()
+    bboxes = {}
+    for kind, items in features.items():
+        for i, (group, _) in enumerate(items):
+            x0, y0, x1, y1 = group_bboxes[group]
+            bboxes[kind, i] = (x0 - margin, y0 - margin, x1 + margin, y1 + margin)
+            index.insert((kind, i), bboxes[kind, i])
+    for i, f in enumerate(switches):
+        bboxes['switch', i] = f.bbox()
+        index.insert(('switch', i), f.bbox())
+
+    outline = np.asarray(case_outline(components), dtype=float)
+    x0, y0 = (outline.min(axis=0) - 1).tolist()
+    x1, y1 = (outline.max(axis=0) + 1).tolist()
+    columns, rows = grid_size(count or os.cpu_count(), x1 - x0, y1 - y0)
+    offsets = [0, wall_outer_width, wall_full_width, wall_outer_width + params['bottom_recess']]
+    avoid = [outline] + [f.points for f in switches] + [np.reshape(bbox, (2, 2)) for bbox in bboxes.values()]
+    avoid = np.concatenate([np.asarray(points, dtype=float).reshape(-1, 2) for points in avoid])
+    avoid = [avoid + d for d in offsets] + [avoid - d for d in offsets]
+    xs = [x0, *cut_positions(x0, x1, columns, [p[:, 0] for p in avoid]), x1]
+    ys = [y0, *cut_positions(y0, y1, rows, [p[:, 1] for p in avoid]), y1]
+
+    tiles = {}
+    for i in range(columns):
+        for j in range(rows):
+            rect = (xs[i], ys[j], xs[i + 1], ys[j + 1])
+            if not polygon_meets_rect(outline, rect):
+                continue
+            near = {kind: [] for kind in [*features, 'switch']}
+            for kind, k in sorted(index.query(rect)):
+                bx0, by0, bx1, by1 = bboxes[kind, k]
+                if bx0 <= rect[2] and bx1 >= rect[0] and by0 <= rect[3] and by1 >= rect[1]:
+                    near[kind].append(switches[k] if kind == 'switch' else features[kind][k])
+            # the 2D shapes are cut a bit larger, the tile is cut from the part
+            clip = translate([rect[0] - 1, rect[1] - 1])(square([rect[2] - rect[0] + 2, rect[3] - rect[1] + 2]))
+            top_shape = intersection()(clip, scad2d(values['outline']))
+            for f in near['switch']:
+                top_shape -= polygon(points = f.points.tolist())
+            tile_shapes = {
+                'top': top_shape,
+                'wall': intersection()(clip, scad2d(flat_shapes['wall'])),
+                'bot': intersection()(clip, scad2d(flat_shapes['bot'])),
+            }
+            bot_body = make_bot_body(tile_shapes, params['bot_height'], union_of(near['bot_things']),
+                union_of(near['bot_holes']), height)
+            top = make_top(tile_shapes, bot_body, params['top_height'], union_of(near['top_things']),
+                union_of(near['top_holes']), height)
+            box = translate([rect[0], rect[1], -1])(cube([rect[2] - rect[0], rect[3] - rect[1], height + 2]))
+            tile = intersection()(box, top)
+            tiles[f"{i}_{j}"] = scale([-1,1,1])(tile) if right_hand else tile
+
+    x_cuts = xs[1:-1]
     if right_hand:
-        out = scale([-1,1,1])(out)
-
-    jig = SolderingJig(
-        switches_pos = [sh.get_key_position(row = r, col = 0, center=True) for r in range(rows)],
-        type = 'vertical',
-        choc = choc_switches
-    )
-    jig2 = SolderingJig(
-        switches_pos = [sh.get_key_position(row = 0, col = c, center=True) for c in range(columns)],
-        type = 'horizontal',
-        choc = choc_switches
-    )
-    jig3 = SolderingJig(
-        switches_pos = [],
-        type = 'diode',
-        choc = choc_switches
-    )
-    #out = (cube(0)
-    #     + jig.make_shape()
-    #     + right(30)(jig2.make_shape())
-    #     + translate([30,30])(jig3.make_shape())
-    #)
+        x_cuts = [-c for c in x_cuts]
+    return tiles, (x_cuts, ys[1:-1])
+
+def stitch_tiles(out_dir, name, tiles, cuts):
+    """Stitch the rendered tiles of a part into '<out_dir>/<name>.stl' and remove them."""
+    tile_dir = os.path.join(out_dir, f"{name}_tiles")
+    triangles = stitch([read_stl(os.path.join(tile_dir, f"{tile}.stl")) for tile in tiles], *cuts)
+    write_stl(os.path.join(out_dir, f"{name}.stl"), triangles)
+    shutil.rmtree(tile_dir)
+    problems = open_edges(triangles)
+    print(f"{name}: {len(tiles)} tiles stitched, " + (f"{problems} open edges" if problems else "watertight"))
+
+def prepare_parts(parts, verbose=False):
+    """Simplify the parts and move their repeated subtrees into modules."""
+    stats = {'nodes_before': 0, 'nodes_after': 0}
+    trees = []
+    for tree in parts.values():
+        part_stats = {}
+        trees.append(normalize_tree(tree, part_stats))
+        stats['nodes_before'] += part_stats['nodes_before']
+        stats['nodes_after'] += part_stats['nodes_after']
+    root, modules = instance_modules(union()(*trees), stats=stats)
+    if verbose:
+        print(f"nodes: {stats['nodes_before']} before normalization, {stats['nodes_after']} after", file=sys.stderr)
+        print(f"{stats['modules']} modules, {stats['nodes_instanced']} nodes once instanced", file=sys.stderr)
+    return dict(zip(parts, root.children)), modules
+
+def scad_text(obj, decimals=default_decimals):
+    parts, modules = prepare_parts({'main': obj})
+    return scad_string(parts, modules, decimals)
+
+printable_parts = ['top', 'top_middle', 'top_bottom', 'bot']
+jig_parts = ['jig_vertical', 'jig_horizontal', 'jig_diode']
+
+def render_job(name, scad, out_path, openscad, cache):
+    start = time.perf_counter()
+    hit = render_scad(scad, out_path, openscad=openscad, cache=cache)
+    return name, hit, time.perf_counter() - start
+
+def pipe_job(name, parts, modules, out_path, openscad, decimals):
+    start = time.perf_counter()
+    pipe_to_openscad(parts, out_path, modules, decimals, openscad)
+    return name, False, time.perf_counter() - start
+
+def render_targets(targets, out_dir, cache, openscad, fmt, jobs=None, decimals=default_decimals):
+    """Render every target to '<out_dir>/<name>.<fmt>', in parallel processes."""
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        futures = []
+        for name, obj in targets.items():
+            out_path = os.path.join(out_dir, f"{name}.{fmt}")
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            if cache is None:
+                parts, modules = prepare_parts({name: obj})
+                futures.append(pool.submit(pipe_job, name, parts, modules, out_path, openscad, decimals))
+            else:
+                futures.append(pool.submit(render_job, name, scad_text(obj, decimals), out_path, openscad, cache))
+        for future in concurrent.futures.as_completed(futures):
+            name, hit, elapsed = future.result()
+            print(f"{name}: {'cached' if hit else 'rendered'} in {elapsed:.2f}s")
+    print(f"{len(targets)} parts in {time.perf_counter() - start:.2f}s")
+
+def build_targets(params, hands, quality=None):
+    # the jigs and what doesn't depend on the hand are only built once
+    graph = part_graph()
+    targets = {}
+    for hand in hands:
+        parts = make_parts(params, right_hand = hand == 'right', quality = quality,
+            names = printable_parts + jig_parts, graph = graph)
+        for name in printable_parts:
+            targets[f"{hand}/{name}"] = parts[name]
+    for name in jig_parts:
+        targets[name] = parts[name]
+    return targets
+
+preview_names = ['top', 'top_middle', 'top_bottom', 'phantoms', 'keys']
+
+def preview_parts(parts):
+    # the parts may be kept for other uses (see make_parts), the modifiers are set on copies
+    return {
+        'top': parts['top'],
+        'top_middle': parts['top_middle'],
+        'top_bottom': parts['top_bottom'],
+        #'bot': parts['bot'],
+        'phantoms': copy.copy(parts['phantoms']).set_modifier('%'),
+        'keys': copy.copy(parts['keys']).set_modifier('%'),
+    }
+
+def watch(params_path, names, out_dir, right_hand=True, quality=None, decimals=default_decimals, interval=0.5):
+    """Write the parts to '<out_dir>/<name>.scad' again whenever the parameter or layout file is saved."""
+    os.makedirs(out_dir, exist_ok=True)
+    graph = part_graph()
+    written = {}
+    def update():
+        start = time.perf_counter()
+        parts = make_parts(load_parameters(params_path), right_hand, quality=quality, names=names, graph=graph)
+        changed = [name for name in names if written.get(name) != graph.versions[name]]
+        for name in changed:
+            prepared, modules = prepare_parts({name: parts[name]})
+            write_scad(os.path.join(out_dir, f"{name}.scad"), prepared, modules, decimals)
+            written[name] = graph.versions[name]
+        print(f"built {', '.join(graph.rebuilt) or 'nothing'}, wrote {len(changed)} files "
+            f"in {time.perf_counter() - start:.2f}s", flush=True)
+    watch_file(params_path, update, interval)
+
+def generate_variants(variants, out_dir, quality=None):
+    # generate the preview of each variant, returns (index, seconds, bytes, problems) for each of them,
+    # the variants whose components interfere are skipped
+    res = []
+    for index, params in variants:
+        start = time.perf_counter()
+        try:
+            components = make_components(params, quality=quality)
+        except ValueError as e:
+            # e.g. no room to place the screws automatically
+            res.append((index, time.perf_counter() - start, None, [str(e)]))
+            continue
+        problems = [describe(p) for p in check_components(params, components)]
+        if problems:
+            res.append((index, time.perf_counter() - start, None, problems))
+            continue
+        parts, modules = prepare_parts(preview_parts(make_parts(params, components=components)))
+        path = os.path.join(out_dir, f"variant_{index:03}.scad")
+        write_scad(path, parts, modules)
+        with open(os.path.join(out_dir, f"variant_{index:03}.json"), 'w') as f:
+            json.dump(params, f, indent=1)
+        res.append((index, time.perf_counter() - start, os.path.getsize(path), []))
+    return res
 
-    scad_render_to_file(out, "out.scad")
+def run_sweep(all_params, out_dir, jobs=None, quality=None):
+    """Generate every variant in parallel, those sharing a thumb cluster in the same worker."""
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = jobs or os.cpu_count()
+    groups = {}
+    for index, params in enumerate(all_params):
+        key = repr([params[name] for name in ['thumb_cluster_key_count', 'thumb_bezier_points',
+            'thumb_position', 'thumb_keycap_spacing', 'choc_switches', 'switch_hole_size', 'shell_offset', 'precision']])
+        groups.setdefault(key, []).append((index, params))
+    # split big groups so that every worker gets something to do
+    chunk_size = max(1, math.ceil(len(all_params) / jobs))
+    chunks = []
+    for group in groups.values():
+        chunks += [group[i:i + chunk_size] for i in range(0, len(group), chunk_size)]
+
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        results = []
+        for chunk_result in pool.map(generate_variants, chunks, [out_dir] * len(chunks), [quality] * len(chunks)):
+            results += chunk_result
+    skipped = 0
+    for index, elapsed, size, problems in sorted(results):
+        if problems:
+            skipped += 1
+            print(f"variant_{index:03}: skipped, {'; '.join(problems)}")
+        else:
+            print(f"variant_{index:03}: {elapsed:.3f}s, {size} bytes")
+    print(f"{len(results)} variants in {time.perf_counter() - start:.2f}s, {skipped} skipped")
 
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Generate the keyboard. Without a command, write everything to out.scad for preview.")
+    parser.add_argument('--left', action='store_true', help="build the left hand instead of the right one")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--profile', metavar='TRACE', help="time the components, print a table and write a chrome trace")
+    parser.add_argument('--profile-openscad', metavar='OPENSCAD', help="with --profile, also render the output of each component")
+    parser.add_argument('-p', '--params', help="parameter file (TOML or JSON), see parameters.py for the defaults")
+    parser.add_argument('--decimals', type=int, default=default_decimals, help="decimals of the numbers in the .scad output")
+    parser.add_argument('--quality', choices=list(tiers), help="how finely round shapes are cut into segments, see quality.py "
+        "(default: preview, print for render and build)")
+    subparsers = parser.add_subparsers(dest='command')
+    render = subparsers.add_parser('render', help="render some parts of one hand to meshes with OpenSCAD")
+    render.add_argument('parts', nargs='*',
+        help=f"parts to render, among {', '.join(part_names)} (default: top and bot)")
+    build = subparsers.add_parser('build', help="render every printable part of both hands and the jigs")
+    build.add_argument('--hand', choices=['left', 'right'], action='append', help="only build this hand")
+    for p in [render, build]:
+        p.add_argument('--out-dir', default='out')
+        p.add_argument('--format', default='stl')
+        p.add_argument('-j', '--jobs', type=int, help="number of parallel renders (default: one per core)")
+        p.add_argument('--openscad', default='openscad', help="OpenSCAD executable")
+        p.add_argument('--cache-dir', default=os.path.join(os.path.expanduser('~'), '.cache', 'keyboard'))
+        p.add_argument('--cache-size', type=int, default=1024, help="maximum size of the render cache, in MB")
+        p.add_argument('--no-cache', action='store_true')
+        p.add_argument('--no-check', action='store_true', help="render even if components interfere")
+        p.add_argument('--tiles', type=int, metavar='N', help="render the top part in about N tiles in parallel, "
+            "then stitch them (STL only)")
+    subparsers.add_parser('check', help="check that the components don't interfere with each other or the case")
+    subparsers.add_parser('place', help="place the screws and weights automatically, and print their positions")
+    query_parser = subparsers.add_parser('query', help="print the positions of the keys and components and the outline "
+        "(python query.py does the same without loading solid)")
+    query.add_arguments(query_parser)
+    sweep = subparsers.add_parser('sweep', help="generate every variant of a parameter sweep")
+    sweep.add_argument('sweep_file', help="TOML or JSON file with a 'grid' of parameter values to try")
+    sweep.add_argument('--out-dir', default='sweep')
+    sweep.add_argument('-j', '--jobs', type=int, help="number of parallel workers (default: one per core)")
+    watch_parser = subparsers.add_parser('watch', help="write parts to .scad files again whenever the parameter file "
+        "(-p) changes, only rebuilding what changed")
+    watch_parser.add_argument('parts', nargs='*',
+        help=f"parts to write, among {', '.join(part_names)} (default: those of the preview)")
+    watch_parser.add_argument('--out-dir', default='watch')
+    watch_parser.add_argument('--interval', type=float, default=0.5, help="seconds between checks of the file")
+    args = parser.parse_args()
+    right_hand = not args.left
+    for name in getattr(args, 'parts', []):
+        if name not in part_names:
+            parser.error(f"unknown part '{name}', should be one of {', '.join(part_names)}")
+    quality = quality_tier(args.quality or ('print' if args.command in ['render', 'build'] else 'preview'))
+
+    if args.command == 'sweep':
+        try:
+            variants = load_sweep(args.sweep_file)
+        except (ValueError, OSError) as e:
+            parser.error(f"{args.sweep_file}: {e}")
+        run_sweep(variants, args.out_dir, args.jobs, quality)
+        return 0
+
+    if args.command == 'watch':
+        if not args.params:
+            parser.error("watch needs a parameter file (-p)")
+        try:
+            watch(args.params, args.parts or preview_names, args.out_dir, right_hand, quality, args.decimals,
+                args.interval)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    try:
+        params = load_parameters(args.params)
+    except (ValueError, OSError) as e:
+        parser.error(f"{args.params}: {e}")
+    try:
+        return run_command(parser, args, params, right_hand, quality)
+    except ValueError as e:
+        # e.g. no room to place the screws automatically, reported like the skipped variants of a sweep
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+def run_command(parser, args, params, right_hand, quality):
+    if args.command == 'check' or args.command in ['render', 'build'] and not args.no_check:
+        start = time.perf_counter()
+        problems = check_components(params)
+        for problem in problems:
+            print(describe(problem), file=sys.stderr)
+        if args.command == 'check':
+            print(f"{len(problems)} problems, checked in {(time.perf_counter() - start) * 1000:.1f}ms")
+        if args.command == 'check' or problems:
+            return 1 if problems else 0
+
+    if args.command == 'query':
+        query.run(args, params, right_hand)
+        return 0
+
+    if args.command == 'place':
+        params.update(auto_screws=params['auto_screws'] or len(params['screws']),
+            auto_weights=params['auto_weights'] or len(params['weights']))
+        components = make_components(params)
+        screws = [[round(c, 2) for c in screw.xy_pos] for screw in components['screws']]
+        weights = [[round(c, 2) for c in weight.pos] for weight in components['weights']]
+        print(f"screws = {json.dumps(screws)}\nweights = {json.dumps(weights)}")
+        return 0
+
+    if args.profile:
+        profiler = Profiler(keep_results=args.profile_openscad is not None)
+        profiler.instrument(
+            [ThumbCluster, Shell, Controller, Screw, JackSocket, WeightedDisc, Support, SolderingJig],
+            sys.modules[__name__],
+            ['make_flat_shapes', 'make_bot_body', 'make_top', 'make_bot', 'make_channel', 'make_switch_and_keycap',
+                'make_color_layers'])
+        try:
+            make_parts(params, right_hand, quality=quality)
+        finally:
+            profiler.restore()
+        render_times = None
+        if args.profile_openscad:
+            render_times = profiler.render_isolated(args.profile_openscad, lambda obj: scad_text(obj, args.decimals))
+        print(profiler.table(render_times))
+        profiler.write_chrome_trace(args.profile)
+        return 0
+
+    if args.command in ['render', 'build']:
+        cache = None if args.no_cache else RenderCache(args.cache_dir, args.cache_size * 1024 * 1024)
+        if args.command == 'render':
+            targets = make_parts(params, right_hand, quality=quality, names=args.parts or ['top', 'bot'])
+        else:
+            targets = build_targets(params, args.hand or ['left', 'right'], quality)
+        stitches = {}
+        if args.tiles:
+            if args.format != 'stl':
+                parser.error("--tiles only works with the stl format")
+            for name in [name for name in targets if name.split('/')[-1] == 'top']:
+                hand = name.split('/')[0] == 'right' if '/' in name else right_hand
+                tiles, cuts = make_top_tiles(params, hand, quality, args.tiles)
+                del targets[name]
+                for tile, tree in tiles.items():
+                    targets[f"{name}_tiles/{tile}"] = tree
+                stitches[name] = (list(tiles), cuts)
+        render_targets(targets, args.out_dir, cache, args.openscad, args.format, args.jobs, args.decimals)
+        for name, (tiles, cuts) in stitches.items():
+            stitch_tiles(args.out_dir, name, tiles, cuts)
+        return 0
+
+    all_parts = make_parts(params, right_hand, args.verbose, quality=quality, names=preview_names)
+    parts = preview_parts(all_parts)
+
+    #parts = {
+    #    'jig_vertical': all_parts['jig_vertical'],
+    #    'jig_horizontal': right(30)(all_parts['jig_horizontal']),
+    #    'jig_diode': translate([30,30])(all_parts['jig_diode']),
+    #}
+
+    parts, modules = prepare_parts(parts, args.verbose)
+    sizes = write_scad("out.scad", parts, modules, args.decimals)
+    if args.verbose:
+        for name in parts:
+            print(f"{name}: {sizes[name]} bytes", file=sys.stderr)
+        print(f"{len(modules)} modules: {sum(sizes[name] for name, _ in modules)} bytes", file=sys.stderr)
 
     return 0
 
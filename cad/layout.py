@@ -0,0 +1,161 @@
+"""
+Layout of the main keys, stored as arrays so that big layouts are handled in bulk.
+"""
+
+import json
+
+import numpy as np
+
+from vector import apply_poses
+
+# key flags
+OTHER_KEY = 1 # its keycap has the color of the thumb keys rather than the alphanumeric one
+
+class KeyLayout:
+    """
+    One entry per key: the 'centers' of the keycaps, their 'rotations' (degrees, counter-
+    clockwise around the center), keycap 'sizes', 'rows' and 'columns' indices (row 0 is
+    at the bottom, column 0 on the left) and 'flags'. Keys are ordered row by row.
+    """
+    def __init__(self, centers, sizes, rotations=None, rows=None, columns=None, flags=None):
+        self.centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+        count = len(self.centers)
+        self.sizes = np.array(np.broadcast_to(np.asarray(sizes, dtype=float), (count, 2)))
+        self.rotations = np.zeros(count, dtype=int) if rotations is None else np.asarray(rotations)
+        self.rows = np.zeros(count, dtype=int) if rows is None else np.asarray(rows, dtype=int)
+        self.columns = np.arange(count) if columns is None else np.asarray(columns, dtype=int)
+        self.flags = np.zeros(count, dtype=int) if flags is None else np.asarray(flags, dtype=int)
+
+    def __len__(self):
+        return len(self.centers)
+
+    @staticmethod
+    def from_grid(rows, columns, keycap_size, pitch, column_stagger, offset):
+        """
+        A rows x columns grid of keys spaced by 'pitch', each column shifted up by its
+        'column_stagger', with the bottom left corner of the first column at [offset, offset].
+        The keys of the first column are flagged OTHER_KEY.
+        """
+        row, col = (a.ravel() for a in np.meshgrid(np.arange(rows), np.arange(columns), indexing='ij'))
+        stagger = np.asarray(column_stagger, dtype=float)
+        centers = np.stack([
+            (keycap_size[0] / 2 + offset) + col * pitch[0],
+            (keycap_size[1] / 2 + offset) + (row * pitch[1] + stagger[col]),
+        ], axis=1)
+        return KeyLayout(centers, keycap_size, rows=row, columns=col, flags=np.where(col == 0, OTHER_KEY, 0))
+
+    @staticmethod
+    def from_kle(kle, pitch, gap):
+        """
+        Layout from the JSON of keyboard-layout-editor.com: a list of rows, each one a list of
+        key labels preceded by dicts changing the position (x, y), size (w, h), rotation
+        (r, rx, ry) or color (c) of the following keys. One unit is 'pitch' mm, and the keycaps
+        are 'gap' mm smaller than the space they take. Keys of another color than the first
+        one are flagged OTHER_KEY.
+        """
+        # in KLE units, with the y axis pointing down
+        keys = []
+        x = y = r = rx = ry = 0
+        base_color = None
+        key_color = None
+        row_index = 0
+        for row in kle:
+            if not isinstance(row, list):
+                # metadata of the whole layout
+                continue
+            w = h = 1
+            column_index = 0
+            for item in row:
+                if isinstance(item, dict):
+                    if 'r' in item:
+                        r = item['r']
+                    if 'rx' in item or 'ry' in item:
+                        rx = item.get('rx', rx)
+                        ry = item.get('ry', ry)
+                        x, y = rx, ry
+                    x += item.get('x', 0)
+                    y += item.get('y', 0)
+                    w = item.get('w', w)
+                    h = item.get('h', h)
+                    key_color = item.get('c', key_color)
+                    continue
+                if base_color is None:
+                    base_color = key_color
+                keys.append([x + w / 2, y + h / 2, w, h, r, rx, ry, row_index, column_index, key_color != base_color])
+                column_index += 1
+                x += w
+                w = h = 1
+            row_index += 1
+            x = rx
+            y += 1
+        if not keys:
+            raise ValueError("the layout has no keys")
+
+        cx, cy, w, h, r, rx, ry, row, col, other = np.array(keys, dtype=float).T
+        angle = np.radians(r)
+        # KLE rotates clockwise as seen on screen
+        px = rx + (cx - rx) * np.cos(angle) - (cy - ry) * np.sin(angle)
+        py = ry + (cx - rx) * np.sin(angle) + (cy - ry) * np.cos(angle)
+        centers = np.stack([px * pitch[0], -py * pitch[1]], axis=1)
+        sizes = np.stack([w * pitch[0] - gap[0], h * pitch[1] - gap[1]], axis=1)
+        rows = row.max() - row
+        # row by row, from the bottom
+        order = np.lexsort([col, rows])
+        rotations = np.where(r == 0, 0, -r)
+        return KeyLayout(centers[order], sizes[order], rotations[order], rows[order], col[order],
+            np.where(other[order] > 0, OTHER_KEY, 0))
+
+    @staticmethod
+    def load_kle(path, pitch, gap):
+        with open(path) as f:
+            return KeyLayout.from_kle(json.load(f), pitch, gap)
+
+    def moved(self, offset):
+        # the same layout, moved so that the bottom left corner of its bounding box is at 'offset'
+        res = KeyLayout(self.centers, self.sizes, self.rotations, self.rows, self.columns, self.flags)
+        res.centers = res.centers - self.corners().reshape(-1, 2).min(axis=0) + offset
+        return res
+
+    def corners(self, sizes=None):
+        """
+        The corners of rectangles of the given sizes (the keycaps by default) centered on the
+        keys, counter-clockwise from the bottom left one, as a (keys, 4, 2) array.
+        """
+        sizes = self.sizes if sizes is None else np.broadcast_to(np.asarray(sizes, dtype=float), self.sizes.shape)
+        signs = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]]) / 2
+        return apply_poses(self.centers, np.radians(self.rotations), signs[np.newaxis] * sizes[:, np.newaxis])
+
+    def key_index(self, row, col):
+        res = np.flatnonzero((self.rows == row) & (self.columns == col))
+        if not len(res):
+            raise ValueError(f"no key at row {row}, column {col}")
+        return res[0]
+
+    def line(self, row=None, col=None):
+        # indices of the keys of a row (from left to right) or a column (from bottom to top)
+        if row is not None:
+            keys = np.flatnonzero(self.rows == row)
+            return keys[np.argsort(self.columns[keys], kind='stable')]
+        keys = np.flatnonzero(self.columns == col)
+        return keys[np.argsort(self.rows[keys], kind='stable')]
+
+    def anchors(self):
+        """
+        Keys the case outline goes around: the lowest and the highest of the leftmost ones, the
+        leftmost and rightmost of the highest ones, and the highest of the rightmost ones.
+        Returns their indices and the [left, bottom, right, top] bounds of every keycap.
+        """
+        corners = self.corners()
+        bounds = np.concatenate([corners.min(axis=1), corners.max(axis=1)], axis=1)
+        left, bottom, right, top = bounds.T
+        leftmost = np.flatnonzero(np.isclose(left, left.min()))
+        rightmost = np.flatnonzero(np.isclose(right, right.max()))
+        highest = np.flatnonzero(np.isclose(top, top.max()))
+        res = {
+            'bottom_left': leftmost[np.argmin(bottom[leftmost])],
+            'top_left': leftmost[np.argmax(top[leftmost])],
+            'highest_left': highest[np.argmin(left[highest])],
+            'highest_right': highest[np.argmax(right[highest])],
+            'top_right': rightmost[np.argmax(top[rightmost])],
+        }
+        return res, bounds
@@ -0,0 +1,199 @@
+"""
+Design parameters of the keyboard: their schema, defaults, and loading them from TOML/JSON files.
+"""
+
+import copy
+import itertools
+import json
+import os
+import sys
+import time
+
+# name: (kind, default, description)
+schema = {
+    'rows': ('int', 4, "rows of the main key grid"),
+    'columns': ('int', 6, "columns of the main key grid"),
+    'column_stagger': ('numbers', [0, 0, 4.5, 9, 4.5, 18 * .15], "vertical offset of each column"),
+    'layout': ('string', "", "keyboard-layout-editor.com JSON file of the main keys, replacing the grid above"),
+    'choc_switches': ('bool', True, "kailh choc switches, regular MX otherwise"),
+    'shell_offset': ('number', 1, "the 'border' around the keycaps"),
+    'keycap_dist': ('vector', [1, 1], "space between keycaps of the main grid"),
+    'switch_hole_size': ('vector', [13.7, 13.7], ""),
+    'thumb_cluster_key_count': ('int', 4, ""),
+    'thumb_keycap_spacing': ('number', .4, "space between keycaps of the thumb cluster"),
+    'thumb_bezier_points': ('bezier', [[0, 0], ["POLAR", 30, -5], ["POLAR", 30, 122], [67.5, -42.5]],
+        "curve along which the thumb keys are placed, scaled to fit them"),
+    'thumb_position': ('vector', [77, -14], "where the thumb curve starts"),
+    'height': ('number', 10, "total height, including bot and top plates"),
+    'top_height': ('number', 2, ""),
+    'bot_height': ('number', 2, ""),
+    'wall_inner_width': ('number', 1, "the bottom plate is below the 'inner' wall"),
+    'wall_outer_width': ('number', 1, "but not below the outer wall, which encloses it"),
+    'bottom_recess': ('number', 0.04, "shrink the bottom plate by this much all around, so that the fit is not as tight"),
+    'roundness': ('number', 1, "radius of the rounding of the outline's corners"),
+    'precision': ('number', 0.01, "parameter step when sampling bezier curves"),
+    'flatten_tolerance': ('number', 0.01,
+        "max deviation of the case outline from the true curves, in mm, 0 to sample them every 'precision' instead"),
+    'outline_kernel': ('bool', False, "compute the 2D outline, its offsets and the switch holes in python (needs shapely)"),
+    'controller_pillar_diam': ('number', 4, ""),
+    'weights': ('points', [[22, 20], [22, 56], [60, 21], [60, 60], [98, 10]], "positions of the weighted discs"),
+    'weight_disc_count': ('int', 1, "discs stacked at each position"),
+    'weight_extra_diam': ('number', 2, ""),
+    'screws': ('points', [[40, 4], [35, 74], [77.5, 78.2], [132, 17], [133, -19]], ""),
+    'screw_pillar_diam': ('number', 7, ""),
+    'screw_z_elevation': ('number', 1, ""),
+    'auto_screws': ('int', 0, "place this many screws automatically instead of at 'screws'"),
+    'auto_weights': ('int', 0, "place this many weights automatically instead of at 'weights'"),
+    'placement_step': ('number', 2, "spacing of the positions tried when placing screws and weights automatically"),
+    'color_strip_height': ('number', 1.4, ""),
+}
+
+def is_number(v):
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+def is_point(v):
+    return isinstance(v, list) and len(v) == 2 and all(is_number(c) for c in v)
+
+def is_bezier_handle(v):
+    if is_point(v):
+        return True
+    if not isinstance(v, list) or not v:
+        return False
+    if v[0] == "SHARP":
+        return len(v) == 1
+    if v[0] in ["RELATIVE", "POLAR"]:
+        return len(v) == 3 and all(is_number(c) for c in v[1:])
+    return False
+
+checks = {
+    'int': lambda v: isinstance(v, int) and not isinstance(v, bool),
+    'string': lambda v: isinstance(v, str),
+    'number': is_number,
+    'bool': lambda v: isinstance(v, bool),
+    'vector': is_point,
+    'numbers': lambda v: isinstance(v, list) and all(is_number(c) for c in v),
+    'points': lambda v: isinstance(v, list) and all(is_point(p) for p in v),
+    'bezier': lambda v: isinstance(v, list) and len(v) == 4 and is_point(v[0]) and is_point(v[3])
+        and is_bezier_handle(v[1]) and is_bezier_handle(v[2]),
+}
+
+def default_parameters():
+    return {name: copy.deepcopy(default) for name, (_, default, _) in schema.items()}
+
+def validate_parameters(params):
+    for name, value in params.items():
+        if name not in schema:
+            raise ValueError(f"unknown parameter '{name}'")
+        kind = schema[name][0]
+        if not checks[kind](value):
+            raise ValueError(f"parameter '{name}' should be of type '{kind}', got {value!r}")
+    if len(params['column_stagger']) != params['columns']:
+        raise ValueError("'column_stagger' should have one value per column")
+    if params['rows'] < 1 or params['columns'] < 1:
+        raise ValueError("the key grid needs at least 1 row and 1 column")
+    if params['thumb_cluster_key_count'] < 2:
+        raise ValueError("the thumb cluster needs at least 2 keys")
+    if params['precision'] <= 0 or params['flatten_tolerance'] < 0:
+        raise ValueError("'precision' and 'flatten_tolerance' should be positive")
+    if params['auto_screws'] < 0 or params['auto_weights'] < 0 or params['placement_step'] <= 0:
+        raise ValueError("'auto_screws', 'auto_weights' and 'placement_step' should be positive")
+    return params
+
+def read_file(path):
+    if os.path.splitext(path)[1] == '.toml':
+        import tomllib
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    with open(path) as f:
+        return json.load(f)
+
+def resolve_layout(params, path):
+    # a layout file given in the file at 'path' is relative to it
+    if isinstance(params.get('layout'), str) and params['layout']:
+        params['layout'] = os.path.join(os.path.dirname(path), params['layout'])
+    return params
+
+def layout_stamp(params):
+    # changes whenever the layout file is saved, for what is built from its contents
+    if not params.get('layout'):
+        return None
+    try:
+        stat = os.stat(params['layout'])
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def load_parameters(path=None, overrides=None):
+    """
+    The defaults, updated with the parameters from the file at 'path' (TOML or JSON) and
+    then with 'overrides'.
+    """
+    params = default_parameters()
+    if path is not None:
+        params.update(resolve_layout(read_file(path), path))
+    if overrides:
+        params.update(copy.deepcopy(overrides))
+    return validate_parameters(params)
+
+def load_sweep(path):
+    """
+    A sweep file has an optional 'base' (path of a parameter file, relative to the sweep file),
+    optional 'parameters' overriding it, and a 'grid' giving the list of values to try for
+    some parameters. Returns the parameters of every combination of the grid. Layout files
+    are relative to the file which names them.
+    """
+    sweep = read_file(path)
+    base = sweep.get('base')
+    if base is not None:
+        base = os.path.join(os.path.dirname(path), base)
+    grid = sweep.get('grid', {})
+    for name, values in grid.items():
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"the grid values of '{name}' should be a non-empty list")
+    res = []
+    for combination in itertools.product(*grid.values()):
+        overrides = dict(sweep.get('parameters', {}))
+        overrides.update(zip(grid.keys(), combination))
+        resolve_layout(overrides, path)
+        res.append(load_parameters(base, overrides))
+    return res
+
+def watched_files(path):
+    # the parameter file at 'path' and the layout file it names
+    try:
+        layout = resolve_layout(read_file(path), path).get('layout')
+    except (ValueError, OSError):
+        layout = None
+    return [path, layout] if isinstance(layout, str) and layout else [path]
+
+def watch_file(path, update, interval=0.5):
+    """
+    Call 'update' now, then each time the parameter file at 'path' or the layout file it names
+    is saved, until interrupted. Its errors (an invalid or missing file...) are printed and don't
+    stop the loop.
+    """
+    mtimes = {}
+    files = [path]
+    def stat(files):
+        res = {}
+        for file in files:
+            try:
+                res[file] = os.stat(file).st_mtime_ns
+            except FileNotFoundError:
+                # editors may remove the file before writing the new one
+                res[file] = mtimes.get(file)
+        return res
+    while True:
+        current = stat(files)
+        if current[path] != mtimes.get(path):
+            # it may name another layout file
+            files = watched_files(path)
+            current = stat(files)
+        if any(current[file] != mtimes.get(file) for file in files):
+            # before the update, so that saving a file while it runs isn't missed
+            mtimes = current
+            try:
+                update()
+            except (ValueError, OSError) as e:
+                print(f"{path}: {e}", file=sys.stderr)
+        time.sleep(interval)
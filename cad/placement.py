@@ -0,0 +1,135 @@
+"""
+Automatic placement of round components (screws, weighted discs) in the case, away from the
+other components and the walls.
+"""
+
+import numpy as np
+
+from interference import contains, polygon_edges, segment_distances
+
+def footprint_distances(footprint, points):
+    # distance from every point to the footprint, negative inside of it
+    if footprint.points is None:
+        return np.hypot(*(points - footprint.center).T) - footprint.radius
+    edges = polygon_edges(footprint.points)
+    res = segment_distances(points, *edges).min(axis=1)
+    return np.where(contains(*edges, points), -res, res)
+
+def outline_centroid(outline):
+    x, y = np.asarray(outline, dtype=float).T
+    x1, y1 = np.roll(x, -1), np.roll(y, -1)
+    cross = x * y1 - x1 * y
+    area = cross.sum() / 2
+    return np.array([((x + x1) * cross).sum(), ((y + y1) * cross).sum()]) / (6 * area)
+
+def outline_grid(outline, step):
+    """
+    The points of a grid with the given step which are inside the outline, and their
+    distance to it.
+    """
+    outline = np.asarray(outline, dtype=float)
+    lo = outline.min(axis=0)
+    hi = outline.max(axis=0)
+    xs = np.arange(lo[0], hi[0] + step / 2, step)
+    ys = np.arange(lo[1], hi[1] + step / 2, step)
+    points = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+    edges = polygon_edges(outline)
+    points = points[contains(*edges, points)]
+    return points, segment_distances(points, *edges).min(axis=1)
+
+def candidate_positions(grid, keep_out, diameter, z, wall):
+    """
+    The points of the grid (see outline_grid) where a circle of 'diameter' fits: its center
+    is at least 'wall' from the outline, and the circle does not overlap the keep-out
+    footprints which exist between the heights z[0] and z[1].
+    """
+    points, distances = grid
+    points = points[distances >= wall]
+    for footprint in keep_out:
+        if footprint.z[1] <= z[0] or z[1] <= footprint.z[0]:
+            continue
+        points = points[footprint_distances(footprint, points) >= diameter / 2]
+    return points
+
+def spread_selection(candidates, count, min_distance, first=None, what="components"):
+    """
+    Pick 'count' candidates, each as far as possible from the previous ones (and at least
+    'min_distance' away), starting with 'first' or the one farthest from their center.
+    Returns their indices.
+    """
+    if first is None:
+        first = np.argmax(np.hypot(*(candidates - candidates.mean(axis=0)).T))
+    chosen = [first]
+    nearest = np.hypot(*(candidates - candidates[first]).T)
+    while len(chosen) < count:
+        best = np.argmax(nearest)
+        if nearest[best] < min_distance:
+            raise ValueError(f"only room for {len(chosen)} of {count} {what}")
+        chosen.append(best)
+        nearest = np.minimum(nearest, np.hypot(*(candidates - candidates[best]).T))
+    return chosen
+
+def packed_selection(candidates, count, min_distance, first, what="components"):
+    # pick the candidates closest to 'first' which are at least 'min_distance' from each other
+    chosen = []
+    for i in np.argsort(np.hypot(*(candidates - candidates[first]).T)):
+        if all(np.hypot(*(candidates[i] - candidates[j])) >= min_distance for j in chosen):
+            chosen.append(i)
+            if len(chosen) == count:
+                return chosen
+    raise ValueError(f"only room for {len(chosen)} of {count} {what}")
+
+def place_spread(candidates, count, min_distance, what="components"):
+    """
+    Positions of 'count' components among the candidates, spread as much as possible.
+    """
+    if count == 0:
+        return []
+    if len(candidates) == 0:
+        raise ValueError(f"no room for any of the {what}")
+    return candidates[spread_selection(candidates, count, min_distance, what=what)].tolist()
+
+def place_balanced(candidates, count, min_distance, target, spread_weight=0.05, passes=10, what="components"):
+    """
+    Positions of 'count' components of the same mass among the candidates, with their center
+    of mass as close as possible to 'target'. They start spread out (or packed if there is not
+    enough room to spread them), then each is moved in turn to where it best balances the
+    others, favouring positions away from them (by 'spread_weight' mm of imbalance per mm).
+    """
+    if count == 0:
+        return []
+    if len(candidates) == 0:
+        raise ValueError(f"no room for any of the {what}")
+    target = np.asarray(target, dtype=float)
+    first = np.argmax(np.hypot(*(candidates - target).T))
+    try:
+        chosen = spread_selection(candidates, count, min_distance, first, what)
+    except ValueError as e:
+        # the farthest ones leave gaps that are too small, pack them from one end instead
+        chosen = None
+        for first in [first, *np.argmin(candidates, axis=0), *np.argmax(candidates, axis=0)]:
+            try:
+                chosen = packed_selection(candidates, count, min_distance, first, what)
+                break
+            except ValueError:
+                pass
+        if chosen is None:
+            raise e
+    for _ in range(passes):
+        changed = False
+        for i in range(count):
+            others = candidates[[c for j, c in enumerate(chosen) if j != i]]
+            if len(others):
+                distances = np.hypot(*(candidates[:, np.newaxis] - others).transpose(2, 0, 1)).min(axis=1)
+            else:
+                distances = np.full(len(candidates), min_distance)
+            com = (others.sum(axis=0) + candidates) / count
+            cost = np.hypot(*(com - target).T) - spread_weight * distances
+            cost[distances < min_distance] = np.inf
+            best = np.argmin(cost)
+            if cost[best] < cost[chosen[i]] - 1e-9:
+                chosen[i] = best
+                changed = True
+        if not changed:
+            break
+    return candidates[chosen].tolist()
@@ -0,0 +1,124 @@
+"""
+Opt-in instrumentation of the functions building the SCAD tree: call counts, time spent in
+python and size of the produced subtrees, per component.
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from scad_tree import count_nodes
+
+class Profiler:
+    def __init__(self, keep_results=False):
+        # name, start, duration, self duration, nodes, depth
+        self.records = []
+        self.results = {}
+        self.keep_results = keep_results
+        self.patched = []
+        self.stack = []
+        self.origin = time.perf_counter()
+
+    def wrap(self, name, func):
+        profiler = self
+
+        def wrapper(*args, **kwargs):
+            profiler.stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                res = func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                children = profiler.stack.pop()
+                if profiler.stack:
+                    profiler.stack[-1] += elapsed
+            # some builders return several trees
+            trees = [t for t in (res if isinstance(res, (list, tuple)) else [res]) if hasattr(t, 'children')]
+            nodes = sum(count_nodes(t) for t in trees)
+            profiler.records.append((name, start - profiler.origin, elapsed, elapsed - children, nodes, len(profiler.stack)))
+            if profiler.keep_results:
+                profiler.results.setdefault(name, []).extend(trees)
+            return res
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    def instrument(self, classes, module=None, functions=()):
+        """
+        Wrap every make_* method of the classes, and the given functions of the module.
+        """
+        for cls in classes:
+            for attr, value in list(vars(cls).items()):
+                if attr.startswith('make_') and callable(value):
+                    self.patched.append((cls, attr, value))
+                    setattr(cls, attr, self.wrap(f"{cls.__name__}.{attr}", value))
+        for attr in functions:
+            value = getattr(module, attr)
+            self.patched.append((module, attr, value))
+            setattr(module, attr, self.wrap(attr, value))
+        return self
+
+    def restore(self):
+        for owner, attr, value in reversed(self.patched):
+            setattr(owner, attr, value)
+        self.patched = []
+
+    def summary(self):
+        res = {}
+        for name, _, elapsed, self_elapsed, nodes, _ in self.records:
+            entry = res.setdefault(name, {'calls': 0, 'time': 0.0, 'self_time': 0.0, 'nodes': 0})
+            entry['calls'] += 1
+            entry['time'] += elapsed
+            entry['self_time'] += self_elapsed
+            entry['nodes'] += nodes
+        return res
+
+    def table(self, render_times=None):
+        summary = self.summary()
+        header = f"{'component':<36} {'calls':>6} {'total ms':>9} {'self ms':>9} {'nodes':>7}"
+        if render_times is not None:
+            header += f" {'render s':>9}"
+        lines = [header]
+        for name, entry in sorted(summary.items(), key=lambda e: -e[1]['time']):
+            line = (f"{name:<36} {entry['calls']:>6} {entry['time'] * 1000:>9.2f} "
+                f"{entry['self_time'] * 1000:>9.2f} {entry['nodes']:>7}")
+            if render_times is not None:
+                render_time = render_times.get(name)
+                line += f" {render_time:>9.2f}" if render_time is not None else f" {'-':>9}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def write_chrome_trace(self, path):
+        # can be loaded in chrome://tracing or https://ui.perfetto.dev
+        events = []
+        for name, start, elapsed, self_elapsed, nodes, depth in self.records:
+            events.append({
+                'name': name,
+                'ph': 'X',
+                'ts': start * 1e6,
+                'dur': elapsed * 1e6,
+                'pid': os.getpid(),
+                'tid': 0,
+                'args': {'nodes': nodes, 'self_ms': self_elapsed * 1000},
+            })
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events}, f)
+
+    def render_isolated(self, openscad, to_scad):
+        """
+        Render what each component produced on its own with OpenSCAD, to attribute the render
+        cost to the python code which generated it. Returns the render time per component.
+        """
+        from render_cache import render_scad
+        from solid import union
+        res = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, results in self.results.items():
+                start = time.perf_counter()
+                try:
+                    render_scad(to_scad(union()(*results)), os.path.join(tmp, 'part.stl'), openscad=openscad)
+                except Exception:
+                    # e.g. 2D shapes can't be exported as STL
+                    continue
+                res[name] = time.perf_counter() - start
+        return res
@@ -0,0 +1,32 @@
+"""
+Tessellation quality of the round shapes. A circle gets as many segments as needed for them to
+stay within 'tolerance' mm of the true circle (the chord error), so that small holes don't get
+as many as big discs. Previews use a coarse tier, the final renders a fine one.
+"""
+
+import math
+
+class Quality:
+    def __init__(self, name, tolerance, min_segments=8):
+        self.name = name
+        self.tolerance = tolerance
+        self.min_segments = min_segments
+
+    def segments(self, diameter):
+        radius = diameter / 2
+        if radius <= self.tolerance:
+            return self.min_segments
+        count = math.ceil(math.pi / math.acos(1 - self.tolerance / radius) - 1e-9)
+        # a multiple of 4, so that circles keep their extent along the axes
+        return max(self.min_segments, 4 * math.ceil(count / 4))
+
+tiers = {
+    'draft': Quality('draft', 0.1),
+    'preview': Quality('preview', 0.03),
+    'print': Quality('print', 0.01),
+}
+
+def quality_tier(name):
+    if name not in tiers:
+        raise ValueError(f"unknown quality '{name}', should be one of {', '.join(tiers)}")
+    return tiers[name]
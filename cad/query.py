@@ -0,0 +1,124 @@
+#!/bin/python3
+"""
+Geometry manifest of the keyboard: the positions of the keys, the outline of the case and the
+positions of the components, as JSON or CSV. The SCAD tree is not built and solid is not
+imported, so it is fast enough to be run by other tools (keymap generator, wiring, plate
+cutting...).
+"""
+
+import argparse
+import csv
+import json
+import sys
+
+from geometry import controller_position, jack_position, make_shell
+from layout import OTHER_KEY
+from parameters import load_parameters
+
+def manifest(params, right_hand=True, decimals=4):
+    """
+    The geometry described by the parameters, as a dict of plain lists and numbers. Positions
+    are in mm, angles in degrees (counter-clockwise) and numbers are rounded to 'decimals'.
+    The right hand is mirrored like its parts are (see keyboard.make_parts).
+    """
+    tc, sh = make_shell(params)
+    screws = params['screws']
+    weights = params['weights']
+    if params['auto_screws'] or params['auto_weights']:
+        # placing them needs the footprints of every component, which come with the rest
+        from keyboard import make_components
+        components = make_components(params, right_hand)
+        screws = [screw.xy_pos for screw in components['screws']]
+        weights = [weight.pos for weight in components['weights']]
+
+    sign = -1 if right_hand else 1
+    def point(p):
+        return {'x': round(sign * float(p[0]), decimals) + 0.0, 'y': round(float(p[1]), decimals) + 0.0}
+    def angle(a):
+        return round(sign * float(a), decimals) + 0.0
+
+    keys = []
+    layout = sh.layout
+    for i in range(len(layout)):
+        keys.append({
+            'name': f"key {layout.rows[i]},{layout.columns[i]}",
+            'cluster': 'main',
+            'row': int(layout.rows[i]),
+            'column': int(layout.columns[i]),
+            **point(layout.centers[i]),
+            'angle': angle(layout.rotations[i]),
+            'width': round(float(layout.sizes[i][0]), decimals),
+            'height': round(float(layout.sizes[i][1]), decimals),
+            'other_color': bool(layout.flags[i] & OTHER_KEY),
+        })
+    for i, (pos, key_angle) in enumerate(tc.switches_positions()):
+        keys.append({
+            'name': f"thumb {i}",
+            'cluster': 'thumb',
+            'row': None,
+            'column': i,
+            **point(pos),
+            'angle': angle(key_angle),
+            'width': tc.keycap_size[0],
+            'height': tc.keycap_size[1],
+            'other_color': True,
+        })
+
+    return {
+        'hand': 'right' if right_hand else 'left',
+        'keys': keys,
+        'outline': [point(p) for p in sh.get_outline_points()],
+        'controller': point(controller_position(params, sh)),
+        'jack': point(jack_position(params, sh)),
+        'screws': [point(p) for p in screws],
+        'weights': [point(p) for p in weights],
+    }
+
+csv_columns = ['kind', 'name', 'x', 'y', 'angle', 'width', 'height']
+
+def manifest_rows(res):
+    # one row per key, component and outline vertex, with the columns above
+    for key in res['keys']:
+        yield ['key', key['name'], key['x'], key['y'], key['angle'], key['width'], key['height']]
+    yield ['controller', 'controller', res['controller']['x'], res['controller']['y'], '', '', '']
+    yield ['jack', 'jack', res['jack']['x'], res['jack']['y'], '', '', '']
+    for kind in ['screws', 'weights']:
+        for i, p in enumerate(res[kind]):
+            yield [kind[:-1], f"{kind[:-1]} {i}", p['x'], p['y'], '', '', '']
+    for i, p in enumerate(res['outline']):
+        yield ['outline', f"outline {i}", p['x'], p['y'], '', '', '']
+
+def write_manifest(res, f, fmt='json'):
+    if fmt == 'json':
+        json.dump(res, f, indent=1)
+        f.write('\n')
+    elif fmt == 'csv':
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(csv_columns)
+        writer.writerows(manifest_rows(res))
+    else:
+        raise ValueError(f"unknown manifest format '{fmt}'")
+
+def add_arguments(parser):
+    parser.add_argument('--format', choices=['json', 'csv'], default='json')
+    parser.add_argument('-o', '--output', help="file to write the manifest to (default: standard output)")
+
+def run(args, params, right_hand):
+    res = manifest(params, right_hand)
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            write_manifest(res, f, args.format)
+    else:
+        write_manifest(res, sys.stdout, args.format)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--left', action='store_true', help="the left hand instead of the right one")
+    parser.add_argument('-p', '--params', help="parameter file (TOML or JSON), see parameters.py for the defaults")
+    add_arguments(parser)
+    args = parser.parse_args()
+    run(args, load_parameters(args.params), not args.left)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+On-disk cache of OpenSCAD renders, addressed by the content of the .scad file.
+"""
+
+import functools
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+
+@functools.lru_cache(maxsize=None)
+def openscad_version(openscad):
+    try:
+        res = subprocess.run([openscad, '--version'], capture_output=True, text=True)
+    except OSError:
+        return 'unknown'
+    # OpenSCAD prints its version on stderr
+    return (res.stdout + res.stderr).strip()
+
+class RenderCache:
+    """
+    Rendered meshes (STL, 3MF...) are stored under the hash of the .scad text they were
+    rendered from and of the OpenSCAD version that rendered them. When the cache grows over
+    'max_bytes', the least recently used entries are evicted.
+    """
+    def __init__(self, directory, max_bytes=1 << 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, scad, fmt, version):
+        h = hashlib.sha256()
+        for part in [version, fmt, scad]:
+            h.update(part.encode())
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def path(self, key, fmt):
+        return os.path.join(self.directory, key + '.' + fmt)
+
+    def get(self, key, fmt):
+        path = self.path(key, fmt)
+        try:
+            # the modification time tracks when the entry was last used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, fmt, src):
+        path = self.path(key, fmt)
+        tmp = path + '.tmp' + str(os.getpid())
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, path)
+        self.evict(keep=path)
+        return path
+
+    def entries(self):
+        res = []
+        for name in os.listdir(self.directory):
+            if '.tmp' in name:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            res.append((st.st_mtime, st.st_size, path))
+        return res
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+def render_scad(scad, out_path, openscad='openscad', cache=None):
+    """
+    Render the given .scad text to 'out_path' (the format is taken from its extension),
+    going through the cache if one is given. Returns whether the cache was hit.
+    """
+    fmt = os.path.splitext(out_path)[1][1:] or 'stl'
+    key = None
+    if cache is not None:
+        key = cache.key(scad, fmt, openscad_version(openscad))
+        cached = cache.get(key, fmt)
+        if cached is not None:
+            shutil.copyfile(cached, out_path)
+            return True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scad_path = os.path.join(tmp, 'part.scad')
+        mesh_path = os.path.join(tmp, 'part.' + fmt)
+        with open(scad_path, 'w') as f:
+            f.write(scad)
+        subprocess.run([openscad, '-o', mesh_path, scad_path], check=True, capture_output=True)
+        if cache is not None:
+            cache.put(key, fmt, mesh_path)
+        shutil.copyfile(mesh_path, out_path)
+    return False
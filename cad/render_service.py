@@ -0,0 +1,324 @@
+#!/bin/python3
+"""
+Local render service: renders parts of the keyboard for several clients, sharing one render
+cache. Requests for parts which are already being rendered wait for that render instead of
+starting another one, and at most 'jobs' renders run at a time.
+
+The protocol is one JSON object per line, answered by one JSON object per line, over a TCP
+connection to localhost or a Unix socket:
+    {"params": {"height": 12}, "parts": ["top", "bot"], "hand": "left", "quality": "print", "format": "stl"}
+    -> {"parts": {"top": "<cache>/<hash>.stl", "bot": ...}, "cached": ["bot"]}
+    {"command": "metrics"}
+    -> {"queue_depth": 0, "running": 1, "requests": 2, ..., "request_latency": {...}}
+"params" overrides the default parameters, every field is optional. Its "layout" file is
+relative to the layouts directory of the service, and can't be outside of it. The paths are
+those of the meshes in the cache, which may evict them once they are not the most recently used.
+"""
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from keyboard import check_components, make_parts, part_graph, part_names, scad_text
+from interference import describe
+from parameters import load_parameters
+from quality import quality_tier
+from render_cache import RenderCache, openscad_version
+from scad_writer import default_decimals
+
+default_port = 8765
+
+class OpenSCADRenderer:
+    def __init__(self, openscad='openscad'):
+        self.openscad = openscad
+        self.version = openscad_version(openscad)
+
+    def render(self, scad_path, out_path):
+        subprocess.run([self.openscad, '-o', out_path, scad_path], check=True, capture_output=True)
+
+class StubRenderer:
+    """
+    Doesn't run OpenSCAD, but writes an empty STL naming the hash of the .scad file after
+    'delay' seconds, to run the service offline (see selfcheck.py).
+    """
+    version = 'stub'
+
+    def __init__(self, delay=0):
+        self.delay = delay
+
+    def render(self, scad_path, out_path):
+        with open(scad_path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        time.sleep(self.delay)
+        with open(out_path, 'w') as f:
+            f.write(f"solid {digest}\nendsolid {digest}\n")
+
+class Metrics:
+    def __init__(self, window=1000):
+        self.counters = collections.Counter()
+        # renders waiting for a worker, and being rendered
+        self.queued = 0
+        self.running = 0
+        # the last 'window' durations, in seconds
+        self.latencies = {
+            'request': collections.deque(maxlen=window),
+            'render': collections.deque(maxlen=window),
+        }
+
+    def snapshot(self):
+        res = {'queue_depth': self.queued, 'running': self.running}
+        for name in ['requests', 'deduplicated_requests', 'deduplicated_renders', 'cache_hits', 'renders', 'errors']:
+            res[name] = self.counters[name]
+        for name, values in self.latencies.items():
+            values = sorted(values)
+            if not values:
+                res[f"{name}_latency"] = None
+                continue
+            def percentile(q):
+                return round(values[min(len(values) - 1, int(q * len(values)))], 4)
+            res[f"{name}_latency"] = {
+                'count': len(values),
+                'mean': round(sum(values) / len(values), 4),
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'max': round(values[-1], 4),
+            }
+        return res
+
+class RenderService:
+    """
+    Renders the parts of the requests with 'renderer' (see OpenSCADRenderer and StubRenderer)
+    into 'cache', on up to 'jobs' threads (the renders are other processes). The .scad files
+    are generated one at a time, with a part graph shared by the requests (see
+    keyboard.part_graph) so that what they have in common is only built once. The layout
+    files of the requests are read from 'layouts_dir' (none are allowed without it).
+    """
+    def __init__(self, cache, renderer, jobs=None, decimals=default_decimals, layouts_dir=None):
+        self.cache = cache
+        self.layouts_dir = os.path.realpath(layouts_dir) if layouts_dir is not None else None
+        self.renderer = renderer
+        self.decimals = decimals
+        self.jobs = jobs or os.cpu_count()
+        self.render_pool = concurrent.futures.ThreadPoolExecutor(self.jobs)
+        self.generate_pool = concurrent.futures.ThreadPoolExecutor(1)
+        self.graph = part_graph()
+        self.metrics = Metrics()
+        # in flight, by request and by cache key
+        self.requests = {}
+        self.renders = {}
+
+    def deduplicated(self, in_flight, key, make_coroutine, counter):
+        task = in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(make_coroutine())
+            in_flight[key] = task
+            task.add_done_callback(lambda _: in_flight.pop(key, None))
+        else:
+            self.metrics.counters[counter] += 1
+        # a client going away must not cancel it for the others
+        return asyncio.shield(task)
+
+    async def handle(self, request):
+        if not isinstance(request, dict):
+            raise ValueError("a request should be a JSON object")
+        if request.get('command', 'render') == 'metrics':
+            return self.metrics.snapshot()
+        if request.get('command', 'render') != 'render':
+            raise ValueError(f"unknown command '{request['command']}'")
+        params = load_parameters(overrides=request.get('params'))
+        if params['layout']:
+            params['layout'] = self.layout_path(params['layout'])
+        names = request.get('parts') or ['top', 'bot']
+        for name in names:
+            if name not in part_names:
+                raise ValueError(f"unknown part '{name}', should be one of {', '.join(part_names)}")
+        hand = request.get('hand', 'right')
+        if hand not in ['left', 'right']:
+            raise ValueError(f"unknown hand '{hand}'")
+        quality = quality_tier(request.get('quality', 'print'))
+        fmt = request.get('format', 'stl')
+        if not isinstance(fmt, str) or not fmt.isalnum():
+            raise ValueError(f"invalid format '{fmt}'")
+
+        self.metrics.counters['requests'] += 1
+        key = json.dumps([params, names, hand, quality.name, fmt], sort_keys=True)
+        return await self.deduplicated(self.requests, key,
+            lambda: self.run_request(params, names, hand == 'right', quality, fmt), 'deduplicated_requests')
+
+    def layout_path(self, layout):
+        # the clients may be other users, they can't have any other file read
+        if self.layouts_dir is None:
+            raise ValueError("this service has no layouts directory")
+        path = os.path.realpath(os.path.join(self.layouts_dir, layout))
+        if os.path.commonpath([path, self.layouts_dir]) != self.layouts_dir:
+            raise ValueError(f"the layout '{layout}' is outside of the layouts directory")
+        return path
+
+    def generate(self, params, names, right_hand, quality):
+        problems = check_components(params)
+        if problems:
+            raise ValueError('; '.join(describe(p) for p in problems))
+        parts = make_parts(params, right_hand, quality=quality, names=names, graph=self.graph)
+        return [scad_text(parts[name], self.decimals) for name in names]
+
+    async def run_request(self, params, names, right_hand, quality, fmt):
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        texts = await loop.run_in_executor(self.generate_pool, self.generate, params, names, right_hand, quality)
+        results = await asyncio.gather(*[self.render(scad, fmt) for scad in texts])
+        self.metrics.latencies['request'].append(time.perf_counter() - start)
+        return {
+            'parts': {name: path for name, (path, _) in zip(names, results)},
+            'cached': [name for name, (_, hit) in zip(names, results) if hit],
+        }
+
+    async def render(self, scad, fmt):
+        # returns the path of the mesh in the cache and whether it was there already
+        key = self.cache.key(scad, fmt, self.renderer.version)
+        path = self.cache.get(key, fmt)
+        if path is not None:
+            self.metrics.counters['cache_hits'] += 1
+            return path, True
+        path = await self.deduplicated(self.renders, key, lambda: self.run_render(scad, key, fmt),
+            'deduplicated_renders')
+        return path, False
+
+    async def run_render(self, scad, key, fmt):
+        self.metrics.queued += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.render_pool, self.render_file, loop, scad, key, fmt)
+
+    def render_file(self, loop, scad, key, fmt):
+        # in a worker thread, the metrics are only changed from the event loop (in the order
+        # of the calls, so before the render is awaited)
+        loop.call_soon_threadsafe(self.started)
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory() as tmp:
+            scad_path = os.path.join(tmp, 'part.scad')
+            mesh_path = os.path.join(tmp, 'part.' + fmt)
+            with open(scad_path, 'w') as f:
+                f.write(scad)
+            loop.call_soon_threadsafe(self.add_running, 1)
+            try:
+                self.renderer.render(scad_path, mesh_path)
+            finally:
+                loop.call_soon_threadsafe(self.add_running, -1)
+            path = self.cache.put(key, fmt, mesh_path)
+        loop.call_soon_threadsafe(self.metrics.latencies['render'].append, time.perf_counter() - start)
+        return path
+
+    def started(self):
+        self.metrics.queued -= 1
+        self.metrics.counters['renders'] += 1
+
+    def add_running(self, count):
+        self.metrics.running += count
+
+    async def client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    res = await self.handle(json.loads(line))
+                except (ValueError, OSError) as e:
+                    # json.JSONDecodeError is a ValueError
+                    self.metrics.counters['errors'] += 1
+                    res = {'error': str(e)}
+                except subprocess.CalledProcessError as e:
+                    self.metrics.counters['errors'] += 1
+                    res = {'error': f"rendering failed: {e.stderr.decode(errors='replace').strip()}"}
+                writer.write(json.dumps(res).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, port=default_port, socket_path=None):
+        if socket_path is not None:
+            server = await asyncio.start_unix_server(self.client, path=socket_path)
+        else:
+            server = await asyncio.start_server(self.client, '127.0.0.1', port)
+        print(f"listening on {socket_path or f'127.0.0.1:{port}'}, {self.jobs} workers", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+def send_request(message, port=default_port, socket_path=None):
+    if socket_path is not None:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(socket_path)
+    else:
+        conn = socket.create_connection(('127.0.0.1', port))
+    with conn, conn.makefile('rwb') as f:
+        f.write(json.dumps(message).encode() + b'\n')
+        f.flush()
+        return json.loads(f.readline())
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=default_port, help="TCP port on localhost")
+    parser.add_argument('--socket', help="Unix socket to use instead of the TCP port")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve = subparsers.add_parser('serve', help="run the service")
+    serve.add_argument('-j', '--jobs', type=int, help="number of parallel renders (default: one per core)")
+    serve.add_argument('--openscad', default='openscad', help="OpenSCAD executable")
+    serve.add_argument('--stub', action='store_true', help="don't run OpenSCAD, write empty meshes")
+    serve.add_argument('--stub-delay', type=float, default=0, help="seconds each render of the stub takes")
+    serve.add_argument('--cache-dir', default=os.path.join(os.path.expanduser('~'), '.cache', 'keyboard'))
+    serve.add_argument('--cache-size', type=int, default=1024, help="maximum size of the render cache, in MB")
+    serve.add_argument('--decimals', type=int, default=default_decimals, help="decimals of the numbers in the .scad files")
+    serve.add_argument('--layouts-dir', help="directory of the layout files the requests may use (default: none)")
+    request = subparsers.add_parser('request', help="render parts with the running service and print their paths")
+    request.add_argument('parts', nargs='*', help=f"among {', '.join(part_names)} (default: top and bot)")
+    request.add_argument('-p', '--params', help="parameter file (TOML or JSON), see parameters.py for the defaults")
+    request.add_argument('--left', action='store_true', help="the left hand instead of the right one")
+    request.add_argument('--quality', default='print')
+    request.add_argument('--format', default='stl')
+    subparsers.add_parser('metrics', help="print the metrics of the running service")
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        renderer = StubRenderer(args.stub_delay) if args.stub else OpenSCADRenderer(args.openscad)
+        service = RenderService(RenderCache(args.cache_dir, args.cache_size * 1024 * 1024), renderer, args.jobs,
+            args.decimals, args.layouts_dir)
+        try:
+            asyncio.run(service.serve(args.port, args.socket))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if args.command == 'metrics':
+        message = {'command': 'metrics'}
+    else:
+        try:
+            params = load_parameters(args.params)
+        except (ValueError, OSError) as e:
+            parser.error(f"{args.params}: {e}")
+        if params['layout']:
+            # the service may not run in the same directory, it must be in its layouts directory
+            params['layout'] = os.path.abspath(params['layout'])
+        message = {
+            'params': params,
+            'parts': args.parts,
+            'hand': 'left' if args.left else 'right',
+            'quality': args.quality,
+            'format': args.format,
+        }
+    res = send_request(message, args.port, args.socket)
+    json.dump(res, sys.stdout, indent=1)
+    print()
+    return 1 if 'error' in res else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
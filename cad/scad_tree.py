@@ -0,0 +1,232 @@
+"""
+Passes over SolidPython object trees, applied before rendering them to a .scad file.
+"""
+
+import copy
+
+# nodes whose result is empty if all of their children are empty
+transparent_ops = {
+    'union', 'translate', 'rotate', 'scale', 'mirror', 'multmatrix', 'color',
+    'hull', 'offset', 'linear_extrude',
+}
+
+def count_nodes(node):
+    # every occurrence counts, since a shared subtree is rendered again each time
+    return 1 + sum(count_nodes(child) for child in node.children)
+
+def is_plain(node):
+    return not node.modifier and not node.is_hole and not node.is_part_root
+
+def is_zero_size(size):
+    if isinstance(size, (int, float)):
+        return size == 0
+    try:
+        return all(s == 0 for s in size)
+    except TypeError:
+        return False
+
+def is_empty(node):
+    if node is None:
+        return True
+    if not is_plain(node):
+        return False
+    if node.name in ('cube', 'square'):
+        return is_zero_size(node.params.get('size'))
+    if node.name in transparent_ops:
+        return all(is_empty(child) for child in node.children)
+    return False
+
+def clone_with_children(node, children):
+    res = copy.copy(node)
+    res.params = dict(node.params)
+    res.children = []
+    res.parent = None
+    res.add(list(children))
+    return res
+
+def pad3(v):
+    v = list(v)
+    return v + [0] * (3 - len(v))
+
+def normalize_node(node, memo):
+    key = id(node)
+    if key in memo:
+        return memo[key]
+
+    children = [normalize_node(child, memo) for child in node.children]
+    res = None
+
+    if node.name == 'union':
+        flat = []
+        for child in children:
+            if child is None:
+                continue
+            if child.name == 'union' and is_plain(child):
+                flat += child.children
+            else:
+                flat.append(child)
+        if not flat:
+            res = None
+        elif len(flat) == 1 and is_plain(node):
+            res = flat[0]
+        else:
+            res = clone_with_children(node, flat)
+    elif node.name == 'difference':
+        if not children or children[0] is None:
+            res = None
+        else:
+            kept = [children[0]] + [c for c in children[1:] if c is not None]
+            if len(kept) == 1 and is_plain(node):
+                res = kept[0]
+            else:
+                res = clone_with_children(node, kept)
+    elif node.name == 'intersection':
+        if any(c is None for c in children):
+            res = None
+        else:
+            res = clone_with_children(node, children)
+    elif node.name in transparent_ops and node.children and all(c is None for c in children):
+        res = None
+    elif node.name == 'translate' and len(children) == 1 and is_plain(node) \
+            and children[0].name == 'translate' and is_plain(children[0]):
+        inner = children[0]
+        v = [a + b for a, b in zip(pad3(node.params['v']), pad3(inner.params['v']))]
+        res = clone_with_children(inner, inner.children)
+        res.params['v'] = v
+    elif node.children:
+        res = clone_with_children(node, [c for c in children if c is not None])
+    elif is_empty(node):
+        res = None
+    else:
+        res = node
+
+    memo[key] = res
+    return res
+
+def normalize_tree(root, stats=None):
+    """
+    Return an equivalent tree where nested unions are collapsed into flat n-ary unions,
+    empty cube(0)/square(0) operands are dropped and chained translations are merged.
+    Subtrees shared in the input stay shared in the output.
+    Node counts before and after are stored in 'stats' if given.
+    """
+    res = normalize_node(root, {})
+    if res is None:
+        from solid import union
+        res = union()
+    elif res is root or res.parent is not None:
+        # the root must not have a parent, otherwise holes are not rendered
+        res = clone_with_children(res, res.children)
+    if stats is not None:
+        stats['nodes_before'] = count_nodes(root)
+        stats['nodes_after'] = count_nodes(res)
+    return res
+
+def node_signatures(root):
+    """
+    Map id(node) to a small integer which is the same for structurally identical subtrees,
+    and the signatures to the number of nodes in their subtree.
+    """
+    from solid.solidpython import py2openscad
+    interned = {}
+    sizes = {}
+    memo = {}
+
+    def visit(node):
+        key = id(node)
+        if key in memo:
+            return memo[key]
+        children = tuple(visit(child) for child in node.children)
+        params = tuple(sorted((str(k), py2openscad(v)) for k, v in node.params.items()))
+        structure = (node.name, params, node.modifier, node.is_hole, node.is_part_root, children)
+        sig = interned.setdefault(structure, len(interned))
+        sizes[sig] = 1 + sum(sizes[c] for c in children)
+        memo[key] = sig
+        return sig
+
+    visit(root)
+    return memo, sizes
+
+def instance_modules(root, min_nodes=3, stats=None):
+    """
+    Find subtrees that appear several times (with at least 'min_nodes' nodes) and emit them
+    once as OpenSCAD modules, every occurrence being replaced by a call to the module.
+    Returns the new tree and the modules, as (name, body) pairs, which must be written in the
+    same file (see scad_writer).
+    """
+    from solid.solidpython import OpenSCADObject
+
+    signatures, sizes = node_signatures(root)
+    occurrences = {}
+
+    def count(node):
+        sig = signatures[id(node)]
+        occurrences[sig] = occurrences.get(sig, 0) + 1
+        for child in node.children:
+            count(child)
+    count(root)
+
+    # holes are rendered specially by SolidPython, don't move them into modules
+    def has_holes(node):
+        return node.is_hole or node.is_part_root or any(has_holes(c) for c in node.children)
+
+    samples = {}
+    def collect(node):
+        samples.setdefault(signatures[id(node)], node)
+        for child in node.children:
+            collect(child)
+    collect(root)
+
+    candidates = {sig for sig, n in occurrences.items()
+        if n >= 2 and sizes[sig] >= min_nodes and not has_holes(samples[sig])}
+
+    while True:
+        calls = {}
+        bodies = {}
+
+        def rewrite(node, memo, top_sig=None):
+            key = id(node)
+            if key in memo:
+                return memo[key]
+            sig = signatures[key]
+            if sig in candidates and sig != top_sig:
+                if sig not in calls:
+                    calls[sig] = OpenSCADObject(f"instance_{sig}", {})
+                res = calls[sig]
+            elif node.children:
+                res = clone_with_children(node, [rewrite(c, memo) for c in node.children])
+            else:
+                res = node
+            memo[key] = res
+            return res
+
+        new_root = rewrite(root, {})
+        for sig in sorted(candidates):
+            bodies[sig] = rewrite(samples[sig], {}, top_sig=sig)
+
+        uses = {}
+        call_names = {call.name for call in calls.values()}
+        def count_calls(node):
+            if node.name in call_names and not node.children:
+                uses[node.name] = uses.get(node.name, 0) + 1
+                return
+            for child in node.children:
+                count_calls(child)
+        count_calls(new_root)
+        for sig in candidates:
+            count_calls(bodies[sig])
+
+        unused = {sig for sig in candidates if uses.get(f"instance_{sig}", 0) < 2}
+        if not unused:
+            break
+        candidates -= unused
+
+    modules = [(f"instance_{sig}", bodies[sig]) for sig in sorted(candidates)]
+
+    if new_root.parent is not None:
+        new_root = clone_with_children(new_root, new_root.children)
+    if stats is not None:
+        stats['modules'] = len(candidates)
+        stats['nodes_inlined'] = count_nodes(root)
+        stats['nodes_instanced'] = count_nodes(new_root) + sum(count_nodes(b) for b in bodies.values())
+    return new_root, modules
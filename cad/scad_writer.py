@@ -0,0 +1,149 @@
+"""
+Streaming .scad output: the tree is written node by node to a file or a pipe instead of being
+rendered to one string first, with numbers rounded to a fixed number of decimals.
+"""
+
+import io
+import subprocess
+import tempfile
+
+from solid.solidpython import non_rendered_classes, py2openscad, _unsubbed_keyword
+
+# enough for 3D printing (0.1µm) and it keeps the output short
+default_decimals = 4
+
+# the output is buffered and written in chunks of about this size
+chunk_size = 1 << 16
+
+def format_number(value, decimals):
+    res = f"{value:.{decimals}f}"
+    if '.' in res:
+        res = res.rstrip('0').rstrip('.')
+    return '0' if res == '-0' else res
+
+def format_value(value, decimals):
+    """
+    Like solid's py2openscad, but with floats (numpy ones included) rounded to 'decimals',
+    without trailing zeros. With decimals=None, the output is exactly that of py2openscad.
+    """
+    if decimals is None:
+        return py2openscad(value)
+    if isinstance(value, (bool, str)):
+        return py2openscad(value)
+    if isinstance(value, int):
+        return str(value)
+    if hasattr(value, 'tolist'):
+        # numpy arrays and scalars
+        return format_value(value.tolist(), decimals)
+    if isinstance(value, float):
+        return format_number(value, decimals)
+    if hasattr(value, '__iter__'):
+        return '[' + ', '.join(format_value(v, decimals) for v in value) + ']'
+    return str(value)
+
+def node_call(node, decimals):
+    # e.g. 'translate(v = [1, 2, 0])', with the modifier if any
+    params = {}
+    for k, v in node.params.items():
+        params[_unsubbed_keyword(k) if isinstance(k, str) else k] = v
+    args = []
+    for k in sorted(params):
+        v = params[k]
+        if v is None:
+            continue
+        args.append(format_value(v, decimals) if isinstance(k, int) else f"{k} = {format_value(v, decimals)}")
+    return f"{node.modifier}{_unsubbed_keyword(node.name)}({', '.join(args)})"
+
+class ScadWriter:
+    """
+    Writes SolidPython trees to a binary stream, in the format of solid.scad_render (the same
+    text if decimals is None). Trees with holes (solid's hole() and part()) are not supported.
+    The number of bytes written for each module and part is kept in 'sizes'.
+    """
+    def __init__(self, stream, decimals=default_decimals):
+        self.stream = stream
+        self.decimals = decimals
+        self.buffer = []
+        self.buffered = 0
+        self.written = 0
+        self.sizes = {}
+
+    def emit(self, text):
+        data = text.encode()
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered >= chunk_size:
+            self.flush()
+
+    def flush(self):
+        self.stream.write(b''.join(self.buffer))
+        self.written += self.buffered
+        self.buffer = []
+        self.buffered = 0
+
+    def tell(self):
+        return self.written + self.buffered
+
+    def write_node(self, node, depth):
+        if node.name in non_rendered_classes:
+            raise ValueError(f"{node.name}() is not supported by the streaming writer")
+        prefix = "\n" + "\t" * depth
+        self.emit(prefix + node_call(node, self.decimals))
+        if not node.children:
+            self.emit(";")
+            return
+        self.emit(" {")
+        for child in node.children:
+            self.write_node(child, depth + 1)
+        self.emit(prefix + "}")
+
+    def write(self, parts, modules=()):
+        """
+        Write the module definitions, as (name, body) pairs (see scad_tree.instance_modules),
+        then the parts ({name: tree}), which OpenSCAD implicitly unions.
+        """
+        for name, body in modules:
+            start = self.tell()
+            self.emit(f"module {name}() {{")
+            self.write_node(body, 1)
+            self.emit("\n}\n")
+            self.sizes[name] = self.tell() - start
+        self.emit("\n")
+        for name, tree in parts.items():
+            start = self.tell()
+            self.write_node(tree, 0)
+            self.sizes[name] = self.sizes.get(name, 0) + self.tell() - start
+        self.emit("\n")
+        self.flush()
+        self.stream.flush()
+        return self.sizes
+
+def write_scad(path, parts, modules=(), decimals=default_decimals):
+    # returns the bytes written per module and part
+    with open(path, 'wb') as f:
+        return ScadWriter(f, decimals).write(parts, modules)
+
+def scad_string(parts, modules=(), decimals=default_decimals):
+    f = io.BytesIO()
+    ScadWriter(f, decimals).write(parts, modules)
+    return f.getvalue().decode()
+
+def pipe_to_openscad(parts, out_path, modules=(), decimals=default_decimals, openscad='openscad'):
+    """
+    Render the parts to 'out_path' with OpenSCAD, which reads the .scad file from its standard
+    input as it is generated. Returns the bytes written per module and part.
+    """
+    cmd = [openscad, '-o', out_path, '-']
+    # OpenSCAD's messages go to a file, a pipe could fill up and block it while we write
+    with tempfile.TemporaryFile() as log:
+        process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=log, stderr=log)
+        try:
+            sizes = ScadWriter(process.stdin, decimals).write(parts, modules)
+            process.stdin.close()
+        except BrokenPipeError:
+            # it stopped reading, its exit code tells why
+            sizes = None
+        if process.wait() != 0 or sizes is None:
+            log.seek(0)
+            raise subprocess.CalledProcessError(process.returncode, cmd, stderr=log.read())
+    return sizes
@@ -0,0 +1,191 @@
+#!/bin/python3
+"""
+Checks of what can be verified without OpenSCAD: run them after changing the code they cover.
+Prints the failed checks and returns 1 if there are any.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from stl import open_edges, read_stl, stitch, write_stl
+
+# stand-in for OpenSCAD, which copies the .scad file (or its standard input) to the output
+stand_in = f"""#!{sys.executable}
+import shutil, sys
+if sys.argv[1] == '--version':
+    print('stand-in')
+    sys.exit(0)
+out, scad = sys.argv[2], sys.argv[3]
+with open(out, 'wb') as f:
+    shutil.copyfileobj(sys.stdin.buffer if scad == '-' else open(scad, 'rb'), f)
+"""
+
+def box_triangles(x0, x1, shift=0.0):
+    # unit box between x0 and x1, its vertices on x = x1 moved by 'shift' along x
+    vertices = [[x + (shift if x == x1 else 0), y, z] for x in (x0, x1) for y in (0, 1) for z in (0, 1)]
+    res = []
+    for a, b, c, d in [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]:
+        res += [[vertices[a], vertices[b], vertices[c]], [vertices[a], vertices[c], vertices[d]]]
+    return np.array(res, dtype=float)
+
+def write_ascii_stl(path, triangles):
+    with open(path, 'w') as f:
+        f.write("solid box\n")
+        for triangle in triangles:
+            f.write("facet normal 0 0 0\nouter loop\n")
+            for v in triangle:
+                f.write(f"vertex {' '.join(repr(float(c)) for c in v)}\n")
+            f.write("endloop\nendfacet\n")
+        f.write("endsolid box\n")
+
+def check_stitch():
+    problems = []
+    left = box_triangles(0, 1)
+    # the renders of both tiles don't put the cut at exactly the same place
+    right = box_triangles(1.00003, 2)
+    with tempfile.TemporaryDirectory() as tmp:
+        binary = os.path.join(tmp, 'left.stl')
+        ascii = os.path.join(tmp, 'right.stl')
+        write_stl(binary, left)
+        write_ascii_stl(ascii, right)
+        meshes = [read_stl(binary), read_stl(ascii)]
+    if not np.allclose(meshes[0], left, atol=1e-6) or not np.allclose(meshes[1], right, atol=1e-6):
+        problems.append("the STL files don't read back as written")
+    if open_edges(meshes[0]) != 0:
+        problems.append("a closed box has open edges")
+    res = stitch(meshes, x_cuts=[1])
+    # both faces on the cut are dropped, 2 triangles each
+    if len(res) != len(left) + len(right) - 4:
+        problems.append(f"stitching two boxes gives {len(res)} triangles instead of {len(left) + len(right) - 4}")
+    if open_edges(res) != 0:
+        problems.append(f"the stitched boxes have {open_edges(res)} open edges")
+    if len(stitch([left], y_cuts=[5])) != len(left):
+        problems.append("stitching drops faces away from the cuts")
+    return problems
+
+def check_build():
+    from keyboard import make_parts, render_targets, scad_text
+    from parameters import load_parameters
+    from render_cache import RenderCache
+    problems = []
+    targets = make_parts(load_parameters(), names=['jig_vertical', 'jig_diode'])
+    with tempfile.TemporaryDirectory() as tmp:
+        openscad = os.path.join(tmp, 'openscad')
+        with open(openscad, 'w') as f:
+            f.write(stand_in)
+        os.chmod(openscad, 0o755)
+        cache = RenderCache(os.path.join(tmp, 'cache'), 1024 * 1024)
+        outputs = []
+        for run_cache in [cache, cache, None]:
+            log = io.StringIO()
+            with contextlib.redirect_stdout(log):
+                render_targets(targets, os.path.join(tmp, 'out'), run_cache, openscad, 'stl', 2)
+            outputs.append(log.getvalue())
+            for name, obj in targets.items():
+                with open(os.path.join(tmp, 'out', f"{name}.stl")) as f:
+                    text = f.read()
+                # without the cache, it is streamed to OpenSCAD, but must be the same
+                if text != scad_text(obj):
+                    problems.append(f"{name} isn't rendered from its .scad text")
+    if outputs[0].count('rendered') != len(targets):
+        problems.append("the first build doesn't render every part")
+    if outputs[1].count('cached') != len(targets):
+        problems.append("the second build doesn't take every part from the cache")
+    if outputs[2].count('rendered') != len(targets):
+        problems.append("the build without cache doesn't render every part")
+    return problems
+
+def check_service():
+    from render_cache import RenderCache
+    from render_service import RenderService, StubRenderer
+    problems = []
+    request = {'parts': ['jig_vertical', 'jig_diode'], 'hand': 'left'}
+    with tempfile.TemporaryDirectory() as tmp:
+        service = RenderService(RenderCache(tmp, 1024 * 1024), StubRenderer(0.5), jobs=2)
+        async def run():
+            # the same request twice at once, and another one sharing a part with it
+            first = await asyncio.gather(service.handle(request), service.handle(request),
+                service.handle({'parts': ['jig_diode'], 'hand': 'right'}))
+            return first, await service.handle(request)
+        (res, same, other), again = asyncio.run(run())
+        metrics = service.metrics.snapshot()
+    if res != same or res['cached']:
+        problems.append(f"concurrent identical requests give {res} and {same}")
+    if other['parts']['jig_diode'] != res['parts']['jig_diode']:
+        problems.append("the jigs of both hands aren't the same render")
+    if sorted(again['cached']) != sorted(request['parts']):
+        problems.append(f"a repeated request isn't taken from the cache: {again}")
+    expected = {'requests': 4, 'deduplicated_requests': 1, 'renders': 2, 'deduplicated_renders': 1, 'cache_hits': 2,
+        'errors': 0, 'queue_depth': 0, 'running': 0}
+    for name, value in expected.items():
+        if metrics[name] != value:
+            problems.append(f"{name} is {metrics[name]} instead of {value}")
+    return problems + check_service_failures()
+
+class FailingRenderer:
+    version = 'failing'
+
+    def render(self, scad_path, out_path):
+        raise OSError("the renderer failed")
+
+def check_service_failures():
+    from render_cache import RenderCache
+    from render_service import RenderService
+    problems = []
+    with tempfile.TemporaryDirectory() as tmp:
+        layouts = os.path.join(tmp, 'layouts')
+        os.mkdir(layouts)
+        service = RenderService(RenderCache(os.path.join(tmp, 'cache'), 1024 * 1024), FailingRenderer(), jobs=1,
+            layouts_dir=layouts)
+        for layout in ['../params.toml', os.path.join(tmp, 'params.toml'), 'sub/../../params.toml']:
+            try:
+                service.layout_path(layout)
+                problems.append(f"the layout '{layout}' outside of the layouts directory is allowed")
+            except ValueError:
+                pass
+        if service.layout_path('sub/../grid.json') != os.path.join(os.path.realpath(layouts), 'grid.json'):
+            problems.append("a layout of the layouts directory isn't found in it")
+        async def run():
+            try:
+                await service.handle({'parts': ['jig_diode']})
+                problems.append("a failed render isn't reported")
+            except OSError:
+                pass
+        asyncio.run(run())
+        metrics = service.metrics.snapshot()
+    for name, value in {'renders': 1, 'queue_depth': 0, 'running': 0}.items():
+        if metrics[name] != value:
+            problems.append(f"after a failed render, {name} is {metrics[name]} instead of {value}")
+    return problems
+
+checks = {
+    'stitch': check_stitch,
+    'build': check_build,
+    'service': check_service,
+}
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('checks', nargs='*', help=f"among {', '.join(checks)} (default: all)")
+    args = parser.parse_args()
+    for name in args.checks:
+        if name not in checks:
+            parser.error(f"unknown check '{name}', should be one of {', '.join(checks)}")
+    failed = 0
+    for name in args.checks or checks:
+        problems = checks[name]()
+        for problem in problems:
+            print(f"{name}: {problem}")
+        failed += bool(problems)
+        print(f"{name}: {'FAILED' if problems else 'ok'}")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
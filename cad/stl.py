@@ -0,0 +1,70 @@
+"""
+STL meshes as (N, 3, 3) arrays of triangles, and the stitching of meshes rendered in tiles
+(see keyboard.make_top_tiles) back into one.
+"""
+
+import struct
+
+import numpy as np
+
+def read_stl(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    # binary files may also start with 'solid', but their size is given by their header
+    if len(data) >= 84:
+        count = struct.unpack_from('<I', data, 80)[0]
+        if len(data) == 84 + 50 * count:
+            records = np.frombuffer(data, dtype=np.dtype([
+                ('normal', '<f4', 3), ('vertices', '<f4', (3, 3)), ('attributes', '<u2')]), count=count, offset=84)
+            return records['vertices'].astype(float)
+    vertices = [line.split()[1:4] for line in data.decode().splitlines() if line.strip().startswith('vertex')]
+    return np.asarray(vertices, dtype=float).reshape(-1, 3, 3)
+
+def write_stl(path, triangles):
+    # binary, the normals are computed from the vertices
+    triangles = np.asarray(triangles, dtype=float).reshape(-1, 3, 3)
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    normals /= np.where(lengths > 0, lengths, 1)[:, np.newaxis]
+    records = np.zeros(len(triangles), dtype=np.dtype([
+        ('normal', '<f4', 3), ('vertices', '<f4', (3, 3)), ('attributes', '<u2')]))
+    records['normal'] = normals
+    records['vertices'] = triangles
+    with open(path, 'wb') as f:
+        f.write(b'stitched'.ljust(80, b' '))
+        f.write(struct.pack('<I', len(triangles)))
+        f.write(records.tobytes())
+
+def on_plane(triangles, axis, position, tolerance):
+    # whether each triangle lies in the plane where coordinate 'axis' is 'position'
+    return np.all(np.abs(triangles[:, :, axis] - position) <= tolerance, axis=1)
+
+def stitch(meshes, x_cuts=(), y_cuts=(), tolerance=1e-4):
+    """
+    Merge the meshes of the tiles of a solid, cut from it along the planes x = c for c in
+    'x_cuts' and y = c for c in 'y_cuts'. The faces the cuts made on both sides of these planes
+    are dropped, so that only the surface of the solid remains, and vertices closer than
+    'tolerance' are merged. The solid must not have faces of its own on the cut planes.
+    """
+    triangles = np.concatenate([np.asarray(m, dtype=float).reshape(-1, 3, 3) for m in meshes])
+    keep = np.ones(len(triangles), dtype=bool)
+    for axis, cuts in [(0, x_cuts), (1, y_cuts)]:
+        for c in cuts:
+            keep &= ~on_plane(triangles, axis, c, tolerance)
+    triangles = triangles[keep]
+    # snap the vertices of both sides of a cut to the same positions
+    return np.round(triangles / tolerance) * tolerance
+
+def open_edges(triangles, tolerance=1e-4):
+    """
+    The number of edges which aren't shared by exactly two triangles, 0 for a watertight mesh.
+    """
+    vertices = np.round(np.asarray(triangles).reshape(-1, 3) / tolerance).astype(np.int64)
+    _, ids = np.unique(vertices, axis=0, return_inverse=True)
+    ids = ids.reshape(-1, 3)
+    edges = np.concatenate([ids[:, [0, 1]], ids[:, [1, 2]], ids[:, [2, 0]]])
+    edges.sort(axis=1)
+    # degenerate triangles have edges from a vertex to itself
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    _, counts = np.unique(edges, axis=0, return_counts=True)
+    return int(np.count_nonzero(counts != 2))
@@ -0,0 +1,139 @@
+#!/bin/python3
+"""
+2D preview of the case as SVG, without OpenSCAD: its outline, the switch holes, the footprints
+of the components (the same as those checked for interference, see keyboard.make_footprints),
+the handles of the bezier curves and the interference problems, in red. Once the modules are
+loaded, a preview takes a few tens of milliseconds, so --watch can follow the edits of a
+parameter file.
+"""
+
+import argparse
+import sys
+import time
+
+from keyboard import case_outline, check_components, make_components, make_footprints
+from interference import describe
+from parameters import load_parameters, watch_file
+
+margin = 5
+
+style = """
+.outline { fill: #eadebb; stroke: #404040; stroke-width: 0.4; }
+.switch, .thumb { fill: #ffffff; stroke: #404040; stroke-width: 0.2; }
+.support { fill: #9a9a9a; }
+.weight { fill: none; stroke: #2060c0; stroke-width: 0.3; }
+.screw { fill: none; stroke: #208020; stroke-width: 0.3; }
+.controller, .jack { fill: #c9c9c9; fill-opacity: 0.6; stroke: #404040; stroke-width: 0.2; }
+.problem { stroke: #e00000; stroke-width: 0.6; }
+.handle { stroke: #e08000; stroke-width: 0.2; }
+.handle circle { fill: #e08000; stroke: none; }
+"""
+
+def number(v):
+    res = f"{v:.3f}".rstrip('0').rstrip('.')
+    return '0' if res == '-0' else res
+
+def preview_svg(params, right_hand=True, components=None):
+    """
+    The preview of the case described by the parameters, as the text of an SVG file (in mm),
+    mirrored for the right hand like its parts are.
+    """
+    if components is None:
+        components = make_components(params, right_hand)
+    outline = case_outline(components)
+    footprints = make_footprints(params, components)
+    problems = check_components(params, components)
+    handles = components['shell'].bezier_handles() + components['thumb_cluster'].bezier_handles()
+
+    # SVG's y axis goes down
+    sign = -1 if right_hand else 1
+    def point(p):
+        return number(sign * float(p[0])), number(-float(p[1]))
+    def points(ps):
+        return ' '.join(','.join(point(p)) for p in ps)
+
+    xs = [sign * float(p[0]) for p in outline]
+    ys = [-float(p[1]) for p in outline]
+    for f in footprints:
+        left, bottom, right, top = f.bbox()
+        xs += [sign * left, sign * right]
+        ys += [-bottom, -top]
+    for segment in handles:
+        xs += [sign * float(p[0]) for p in segment]
+        ys += [-float(p[1]) for p in segment]
+    left, top = min(xs) - margin, min(ys) - margin
+    width, height = max(xs) + margin - left, max(ys) + margin - top
+
+    wrong = {}
+    for problem in problems:
+        for name in problem[1]:
+            wrong.setdefault(name, []).append(describe(problem))
+
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{number(width)}mm" height="{number(height)}mm" '
+            f'viewBox="{number(left)} {number(top)} {number(width)} {number(height)}">',
+        f'<style>{style}</style>',
+        f'<polygon class="outline" points="{points(outline)}"/>',
+    ]
+    for f in footprints:
+        kind = f.kind
+        title = f.name
+        if f.name in wrong:
+            kind += ' problem'
+            title += ': ' + '; '.join(wrong[f.name])
+        if f.points is None:
+            x, y = point(f.center)
+            lines.append(f'<circle class="{kind}" cx="{x}" cy="{y}" r="{number(f.radius)}"><title>{title}</title></circle>')
+        else:
+            lines.append(f'<polygon class="{kind}" points="{points(f.points)}"><title>{title}</title></polygon>')
+    for p1, h1, h2, p2 in handles:
+        lines.append('<g class="handle">')
+        for start, end in [(p1, h1), (p2, h2)]:
+            if start == end:
+                # sharp corner
+                continue
+            (x1, y1), (x2, y2) = point(start), point(end)
+            lines.append(f'<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}"/><circle cx="{x2}" cy="{y2}" r="0.6"/>')
+        lines.append('</g>')
+    lines.append('</svg>')
+    return '\n'.join(lines) + '\n'
+
+def write_preview(params_path, out_path, right_hand):
+    start = time.perf_counter()
+    svg = preview_svg(load_parameters(params_path), right_hand)
+    with open(out_path, 'w') as f:
+        f.write(svg)
+    return time.perf_counter() - start
+
+def watch(params_path, out_path, right_hand, interval=0.2):
+    def update():
+        elapsed = write_preview(params_path, out_path, right_hand)
+        print(f"{out_path} written in {elapsed * 1000:.0f}ms", flush=True)
+    watch_file(params_path, update, interval)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--left', action='store_true', help="the left hand instead of the right one")
+    parser.add_argument('-p', '--params', help="parameter file (TOML or JSON), see parameters.py for the defaults")
+    parser.add_argument('-o', '--output', default='preview.svg')
+    parser.add_argument('--watch', action='store_true', help="write the preview again whenever the parameter file changes")
+    args = parser.parse_args()
+    right_hand = not args.left
+    if not args.watch:
+        try:
+            elapsed = write_preview(args.params, args.output, right_hand)
+        except (ValueError, OSError) as e:
+            parser.error(f"{args.params}: {e}")
+        print(f"{args.output} written in {elapsed * 1000:.0f}ms")
+        return 0
+    if not args.params:
+        parser.error("--watch needs a parameter file (-p)")
+    try:
+        watch(args.params, args.output, right_hand)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
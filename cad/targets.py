@@ -0,0 +1,87 @@
+"""
+Lazy, incremental evaluation of named targets: each target declares the parameters and the
+other targets it is built from, only what is requested is built, and what was already built
+from the same inputs is reused.
+"""
+
+class Target:
+    """
+    'build' is called with a dict of only the declared parameters, followed by the values of
+    the targets it depends on, in the order of 'deps'.
+    """
+    def __init__(self, name, build, params=(), deps=()):
+        self.name = name
+        self.build = build
+        self.params = list(params)
+        self.deps = list(deps)
+
+class TargetGraph:
+    def __init__(self, targets):
+        self.targets = {}
+        for target in targets:
+            if target.name in self.targets:
+                raise ValueError(f"duplicate target '{target.name}'")
+            self.targets[target.name] = target
+        self.values = {}
+        # the inputs each value was built from, and its version, which changes with the value
+        self.keys = {}
+        self.versions = {}
+        self.last_version = 0
+        # the targets built by the last evaluate()
+        self.rebuilt = []
+
+    def order(self, names, given=()):
+        # the targets needed for 'names', each one after its dependencies
+        res = []
+        done = set()
+        visiting = []
+        def visit(name):
+            if name not in self.targets:
+                raise ValueError(f"unknown target '{name}'")
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"dependency cycle: {' -> '.join(visiting[visiting.index(name):] + [name])}")
+            visiting.append(name)
+            if name not in given:
+                for dep in self.targets[name].deps:
+                    visit(dep)
+            visiting.pop()
+            done.add(name)
+            res.append(name)
+        for name in names:
+            visit(name)
+        return res
+
+    def store(self, name, key, value):
+        self.last_version += 1
+        self.values[name] = value
+        self.keys[name] = key
+        self.versions[name] = self.last_version
+
+    def evaluate(self, names, inputs, given=None):
+        """
+        The values of the targets in 'names', as a dict, with the parameters given in 'inputs'.
+        Targets are only built again if a parameter they depend on changed, or one of their
+        dependencies was built again. The values in 'given' ({name: value}) are used instead of
+        building these targets.
+        """
+        given = given or {}
+        self.rebuilt = []
+        for name in self.order(names, given):
+            if name in given:
+                if self.values.get(name) is not given[name]:
+                    self.store(name, None, given[name])
+                continue
+            target = self.targets[name]
+            params = {}
+            for param in target.params:
+                if param not in inputs:
+                    raise ValueError(f"target '{name}' depends on '{param}', which is not given")
+                params[param] = inputs[param]
+            key = (repr(params), [self.versions[dep] for dep in target.deps])
+            if name in self.values and self.keys[name] == key:
+                continue
+            self.store(name, key, target.build(params, *[self.values[dep] for dep in target.deps]))
+            self.rebuilt.append(name)
+        return {name: self.values[name] for name in names}
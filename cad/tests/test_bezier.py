@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from geometry import (bezier_arc_length, bezier_from_points, bezier_handles, bezier_lines, bezier_parameter_at_length,
+    convert_bezier_points, evaluate_bezier, flatten_bezier, make_shell, outline_defects, sample_bezier_evenly)
+from parameters import load_parameters
+
+def thumb_curve():
+    points, _ = convert_bezier_points(load_parameters()['thumb_bezier_points'])
+    return bezier_from_points(points)
+
+def library_samples(curve, precision):
+    # how the curve was sampled before the Bernstein matrices, one evaluation per step
+    coords = []
+    tangents = []
+    x = 0.0
+    while True:
+        p = curve.evaluate(x)
+        coords.append([p[0][0], p[1][0]])
+        tangent = curve.evaluate_hodograph(x)
+        tangents.append([tangent[0][0], tangent[1][0]])
+        if x == 1.0:
+            break
+        x = min(x + precision, 1.0)
+    return np.array(coords), np.array(tangents)
+
+@pytest.mark.parametrize('precision', [0.01, 0.03, 0.3, 1.0, 2.0])
+def test_sampling_matches_the_bezier_library(precision):
+    curve = thumb_curve()
+    coords, tangents = sample_bezier_evenly(curve, precision)
+    expected_coords, expected_tangents = library_samples(curve, precision)
+    assert coords.shape == expected_coords.shape
+    assert np.allclose(coords, expected_coords, rtol=0, atol=1e-9)
+    assert np.allclose(tangents, expected_tangents, rtol=0, atol=1e-9)
+
+def distances_to_polyline(points, polyline):
+    # distance of each point to the closest segment of the polyline
+    points = np.asarray(points, dtype=float)[:, np.newaxis]
+    polyline = np.asarray(polyline, dtype=float)
+    start = polyline[:-1]
+    edge = polyline[1:] - start
+    lengths_squared = np.maximum((edge ** 2).sum(axis=1), 1e-30)
+    along = np.clip(((points - start) * edge).sum(axis=2) / lengths_squared, 0, 1)
+    return np.hypot(*(start + along[..., np.newaxis] * edge - points).T).min(axis=0)
+
+def dense_curve(curve):
+    coords, _ = evaluate_bezier(curve, np.linspace(0, 1, 4001))
+    return coords
+
+# its handles past the ends of the chord make it overshoot both of them
+overshooting_curve = bezier_from_points([[1, 73], [-24, 73], [25, 73], [0, 73]])
+
+@pytest.mark.parametrize('tolerance', [0.5, 0.05, 0.001])
+@pytest.mark.parametrize('curve', [thumb_curve(), overshooting_curve], ids=['thumb', 'overshooting'])
+def test_flattened_curve_stays_within_tolerance(curve, tolerance):
+    flattened = flatten_bezier(curve, tolerance)
+    dense = dense_curve(curve)
+    assert (flattened[[0, -1]] == curve.nodes.T[[0, -1]]).all()
+    assert distances_to_polyline(dense, flattened).max() <= tolerance
+    assert distances_to_polyline(flattened, dense).max() <= 1e-5
+
+# a path with a curve, a segment between two equal points, lines and a curve overshooting its
+# ends, closed by its last segment
+path = [
+    [0, 0], ["POLAR", 30, 0], ["POLAR", 30, 90],
+    [60, 40], ["SHARP"], ["SHARP"],
+    [60, 40], ["SHARP"], ["SHARP"],
+    [1, 73], ["RELATIVE", -25, 10], ["RELATIVE", 25, 10],
+    [-10, 73], ["SHARP"], ["SHARP"],
+]
+
+@pytest.mark.parametrize('tolerance', [None, 0.1, 0.001])
+def test_flattened_path_stays_within_tolerance(tolerance):
+    counts = []
+    res = bezier_lines(path, 0.01, tolerance, counts)
+    assert len(counts) == 5 and counts[1] == 0 and sum(counts) == len(res)
+    closed = res + res[:1]
+    for segment in bezier_handles(path):
+        dense = dense_curve(bezier_from_points(segment))
+        assert distances_to_polyline(dense, closed).max() <= (tolerance or 0.01)
+
+@pytest.mark.parametrize('tolerance', [None, 0.1])
+def test_flattened_path_has_no_repeated_points(tolerance):
+    res = bezier_lines(path, 0.01, tolerance)
+    assert outline_defects(res) == []
+
+def test_arc_length():
+    # the quadrature is only exact for curves whose speed doesn't drop to 0, as thumb curves
+    curve = thumb_curve()
+    assert bezier_arc_length(curve, 0.0) == 0
+    assert bezier_arc_length(curve, 1.0) == pytest.approx(curve.length, abs=1e-9)
+    dense = dense_curve(curve)
+    assert bezier_arc_length(curve, 0.5) == pytest.approx(np.hypot(*np.diff(dense[:2001], axis=0).T).sum(), abs=1e-5)
+
+@pytest.mark.parametrize('curve', [thumb_curve(), overshooting_curve], ids=['thumb', 'overshooting'])
+def test_parameter_at_length_inverts_the_arc_length(curve):
+    total = bezier_arc_length(curve, 1.0)
+    assert bezier_parameter_at_length(curve, 0.0) == 0.0
+    assert bezier_parameter_at_length(curve, total) == 1.0
+    for length in np.linspace(0, total, 37)[1:-1]:
+        t = bezier_parameter_at_length(curve, length, total)
+        assert 0 < t < 1
+        assert bezier_arc_length(curve, t) == pytest.approx(length, abs=1e-8)
+
+@pytest.mark.parametrize('key_count', [2, 4, 7])
+def test_thumb_keys_are_evenly_spaced_along_the_curve(key_count):
+    tc, _ = make_shell(load_parameters(overrides={'thumb_cluster_key_count': key_count}))
+    poses = tc.get_thumb_keys_pos()
+    lengths = [bezier_arc_length(tc.bezier_curve, t) for _, _, t in poses]
+    # the curve is scaled so that consecutive keys are a keycap and its spacing apart
+    spacing = tc.keycap_size[0] + tc.keycap_spacing
+    assert np.allclose(np.diff(lengths) * tc.curve_scale_factor, spacing, rtol=0, atol=1e-6)
+    coords, tangents = evaluate_bezier(tc.bezier_curve, [t for _, _, t in poses])
+    assert np.allclose([p for p, _, _ in poses], tc.position + tc.curve_scale_factor * coords)
+    assert np.allclose([angle for _, angle, _ in poses], np.arctan2(tangents[:, 1], tangents[:, 0]))
@@ -0,0 +1,33 @@
+import json
+
+import numpy as np
+import pytest
+
+from layout import OTHER_KEY, KeyLayout
+
+# a 1.5u key, a row shifted by half a key down and a quarter right, a key of another color
+kle = [
+    {"name": "fixture"},
+    [{"c": "#cccccc"}, "Q", {"w": 1.5}, "W", "E"],
+    [{"y": 0.5, "x": 0.25}, "A", {"c": "#aaaaaa"}, "S"],
+]
+
+def test_from_kle():
+    layout = KeyLayout.from_kle(kle, [19, 19], [1, 1])
+    # row by row from the bottom: A S, then Q W E
+    assert np.allclose(layout.centers, [[14.25, -38], [33.25, -38], [9.5, -9.5], [33.25, -9.5], [57, -9.5]])
+    assert np.allclose(layout.sizes, [[18, 18], [18, 18], [18, 18], [27.5, 18], [18, 18]])
+    assert layout.rows.tolist() == [0, 0, 1, 1, 1]
+    assert layout.columns.tolist() == [0, 1, 0, 1, 2]
+    assert layout.flags.tolist() == [0, OTHER_KEY, 0, 0, 0]
+    assert layout.rotations.tolist() == [0] * 5
+
+def test_load_kle(tmp_path):
+    path = tmp_path / 'layout.json'
+    path.write_text(json.dumps(kle))
+    layout = KeyLayout.load_kle(path, [19, 19], [1, 1])
+    assert np.allclose(layout.centers, KeyLayout.from_kle(kle, [19, 19], [1, 1]).centers)
+
+def test_from_kle_without_keys():
+    with pytest.raises(ValueError):
+        KeyLayout.from_kle([{"name": "empty"}, []], [19, 19], [1, 1])
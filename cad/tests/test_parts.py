@@ -0,0 +1,34 @@
+import json
+import os
+
+from keyboard import make_parts, part_graph
+from parameters import load_parameters, watched_files
+
+layout = [["Q", "W", "E"], ["A", "S", "D"]]
+
+def write_layout(path, kle, mtime_ns):
+    path.write_text(json.dumps(kle))
+    # saved again within the resolution of the file system's clock
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+def test_shell_is_rebuilt_when_the_layout_file_is_saved(tmp_path):
+    path = tmp_path / 'layout.json'
+    write_layout(path, layout, 10**18)
+    params = load_parameters(overrides={'layout': str(path)})
+    graph = part_graph()
+    first = make_parts(params, names=['jig_vertical'], graph=graph)['jig_vertical']
+    make_parts(params, names=['jig_vertical'], graph=graph)
+    assert graph.rebuilt == []
+    write_layout(path, [["Q", "W", "E"], ["A", "S", "D"], ["Z", "X", "C"]], 10**18 + 1)
+    again = make_parts(params, names=['jig_vertical'], graph=graph)['jig_vertical']
+    assert 'shell' in graph.rebuilt
+    assert again is not first
+
+def test_watched_files(tmp_path):
+    params = tmp_path / 'params.toml'
+    params.write_text('layout = "layout.json"\n')
+    assert watched_files(str(params)) == [str(params), os.path.join(str(tmp_path), 'layout.json')]
+    params.write_text('rows = 3\n')
+    assert watched_files(str(params)) == [str(params)]
+    params.write_text('rows = \n')
+    assert watched_files(str(params)) == [str(params)]
@@ -0,0 +1,41 @@
+import copy
+
+import pytest
+
+from geometry import eps, make_shell
+from parameters import load_parameters
+
+def make_thumb_cluster(**overrides):
+    tc, _ = make_shell(load_parameters(overrides=overrides))
+    return tc
+
+@pytest.mark.parametrize('precision', [0.002, 0.01])
+def test_band_covers_the_keycaps(precision):
+    shapely = pytest.importorskip('shapely')
+    from shapely.ops import unary_union
+    tc = make_thumb_cluster(precision=precision)
+    band = shapely.geometry.Polygon(tc.get_band_points())
+    keycaps = unary_union([shapely.geometry.Polygon(r) for r in tc.get_keycap_rectangles()])
+    assert band.is_valid
+    assert keycaps.difference(band.buffer(eps)).area == 0
+    # only the notches between consecutive keycaps are filled
+    assert band.hausdorff_distance(keycaps) < 0.15
+
+def test_band_inner_side_is_the_shape():
+    tc = make_thumb_cluster()
+    band = tc.get_band_points()
+    inner = tc.get_shape_points()[::-1]
+    # between the corners of the first and last keycaps
+    assert band[1:len(inner) + 1] == inner
+
+def test_changing_a_cluster_leaves_the_next_ones_alone():
+    tc = make_thumb_cluster()
+    points = tc.thumb_curve_points.copy()
+    key_poses = copy.deepcopy(tc.get_thumb_keys_pos())
+    tc.get_thumb_keys_pos()[0][0] = [0, 0]
+    tc.precision = 0.1
+    assert len(tc.thumb_curve_points) == 11
+    other = make_thumb_cluster()
+    assert other is not tc
+    assert (other.thumb_curve_points == points).all()
+    assert other.get_thumb_keys_pos() == key_poses
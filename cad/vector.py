@@ -0,0 +1,129 @@
+"""
+Small immutable vectors and 2D poses, for the coordinates handled one at a time. They are
+tuples, so they can be given as is to solid and shapely. Many points are handled at once as
+numpy arrays instead, see Pose.apply.
+"""
+
+import math
+
+import numpy as np
+
+class Vec(tuple):
+    """
+    2D or 3D vector: Vec(1, 2) or Vec([1, 2]). Arithmetic is done per coordinate, with
+    sequences of the same length or with scalars (for * and /).
+    """
+    __slots__ = ()
+
+    def __new__(cls, *coords):
+        if len(coords) == 1:
+            coords = coords[0]
+        return tuple.__new__(cls, coords)
+
+    @staticmethod
+    def polar(length, angle):
+        # angle in radians
+        return Vec(length * math.cos(angle), length * math.sin(angle))
+
+    @property
+    def x(self):
+        return self[0]
+
+    @property
+    def y(self):
+        return self[1]
+
+    @property
+    def z(self):
+        return self[2]
+
+    def check_length(self, other):
+        if len(other) != len(self):
+            raise ValueError(f"can't combine vectors of {len(self)} and {len(other)} coordinates")
+        return other
+
+    def __add__(self, other):
+        return Vec([a + b for a, b in zip(self, self.check_length(other))])
+
+    def __radd__(self, other):
+        return Vec([b + a for a, b in zip(self, self.check_length(other))])
+
+    def __sub__(self, other):
+        return Vec([a - b for a, b in zip(self, self.check_length(other))])
+
+    def __rsub__(self, other):
+        return Vec([b - a for a, b in zip(self, self.check_length(other))])
+
+    def __neg__(self):
+        return Vec([-a for a in self])
+
+    def __mul__(self, k):
+        return Vec([a * k for a in self])
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, k):
+        return Vec([a / k for a in self])
+
+    def length(self):
+        return math.sqrt(sum(a * a for a in self))
+
+    def rotated(self, angle):
+        # around the origin (or the z axis), counter-clockwise, in radians
+        c, s = math.cos(angle), math.sin(angle)
+        x, y = self[0], self[1]
+        return Vec([c * x - s * y, s * x + c * y, *self[2:]])
+
+class Pose(tuple):
+    """
+    2D position and orientation (radians, counter-clockwise), i.e. the rigid transform taking
+    local coordinates (x along the orientation, y to its left) to global ones. As a tuple,
+    it unpacks to (position, angle).
+    """
+    __slots__ = ()
+
+    def __new__(cls, position, angle=0):
+        return tuple.__new__(cls, (Vec(position), angle))
+
+    @property
+    def position(self):
+        return self[0]
+
+    @property
+    def angle(self):
+        return self[1]
+
+    def transform(self, local):
+        # global coordinates of a local point
+        return self.position + Vec(local).rotated(self.angle)
+
+    def compose(self, other):
+        # 'other' given in the local coordinates of this pose
+        return Pose(self.transform(other.position), self.angle + other.angle)
+
+    def inverse(self):
+        return Pose((-self.position).rotated(-self.angle), -self.angle)
+
+    def apply(self, points):
+        # global coordinates of an array of local points, in any (..., 2) shape
+        points = np.asarray(points, dtype=float)
+        c, s = math.cos(self.angle), math.sin(self.angle)
+        return np.stack([
+            self.position[0] + c * points[..., 0] - s * points[..., 1],
+            self.position[1] + s * points[..., 0] + c * points[..., 1],
+        ], axis=-1)
+
+def apply_poses(positions, angles, points):
+    """
+    Batched Pose.apply: the local points placed with each of the N poses given as arrays of
+    positions (N, 2) and angles (N,). The points are the same for every pose (shape (M, 2)) or
+    given per pose (shape (N, M, 2)). Returns an (N, M, 2) array.
+    """
+    positions = np.asarray(positions, dtype=float)
+    angles = np.asarray(angles, dtype=float)[:, np.newaxis]
+    points = np.asarray(points, dtype=float)
+    c, s = np.cos(angles), np.sin(angles)
+    return positions[:, np.newaxis] + np.stack([
+        c * points[..., 0] - s * points[..., 1],
+        s * points[..., 0] + c * points[..., 1],
+    ], axis=-1)